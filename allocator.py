@@ -0,0 +1,224 @@
+import heapq
+from itertools import islice
+from qasm import (
+    GATE,
+    MEASURE,
+    MEASURE_REGISTER,
+    QREG,
+    Q_INDEX,
+    Q_REG,
+    Q_SLICE,
+    RESET,
+    RESET_QUBIT,
+    InstructionList,
+    gate_arguments,
+    gate_operands,
+)
+from scope import MEASUREMENT_QUBIT_NAME, QUBIT_POOL_NAME
+
+
+class QubitAllocator:
+    """
+    The QubitAllocator maps the quantum registers of a region, including the measurement qubit, onto
+    as few qubits as it can, all in one register. A qubit is live from the first instruction that
+    uses it to the last one, so once a qubit is no longer used (such as after it was measured), the
+    qubit it was mapped onto can be given to a qubit that starts being used later. A qubit that is
+    reset without a condition starts over after the reset, so the measurement qubit is only live
+    while it sets a bit of a classical register. A qubit that is given back after being reset is
+    in its initial state, and is preferred; any other qubit is reset before it is reused.
+    Instructions that are repeated over a slice or broadcast over a register are written out for
+    each qubit, since the qubits of a register are not kept together.
+    The number of qubits the region was mapped onto, its width, is recorded for each region.
+    """
+
+    def __init__(self):
+        # The number of qubits declared by each region, and the number it was mapped onto
+        self.widths = {}
+        # The number of qubits used so far by the region being mapped
+        self.width = 0
+
+    def allocate_program(self, name, program):
+        sizes = {MEASUREMENT_QUBIT_NAME: 1} if program.measurement_qubit_needed else {}
+        declared = sum(sizes.values())
+        for opcode, operands, _ in program.instructions:
+            if opcode == QREG:
+                declared += operands[1]
+        last_uses, clean = self.find_live_ranges(program.instructions, dict(sizes))
+        allocated = InstructionList()
+        # The size of the register is only known once every qubit has been mapped
+        allocated.append(QREG, (QUBIT_POOL_NAME, 0))
+        self.width = 0
+        allocated.extend(
+            self.map_qubits(program.instructions, dict(sizes), last_uses, clean)
+        )
+        width = self.width
+        if width > 0:
+            allocated.operands[1] = width
+            program.instructions = allocated
+        else:
+            program.instructions = InstructionList()
+            program.instructions.extend(islice(allocated, 1, None))
+        program.measurement_qubit_needed = False
+        self.widths[name] = (declared, width)
+
+    @staticmethod
+    def expand(instructions, sizes: dict):
+        """
+        Returns the instructions, with each instruction that acts on several qubits repeated for
+        each of them, along with the qubits each instruction acts on
+        """
+        for opcode, operands, condition in instructions:
+            if opcode == QREG:
+                sizes[operands[0]] = operands[1]
+                yield opcode, operands, condition, []
+            elif opcode == GATE:
+                name, cargs, qargs = gate_arguments(operands)
+                # Like emit_gate, the gate is repeated over the last slice or whole register
+                repeat = None
+                qubits = []
+                for i, q in enumerate(qargs):
+                    if q[0] == Q_INDEX:
+                        qubits.append((q[1], q[2]))
+                    elif q[0] == Q_SLICE:
+                        repeat = (i, range(q[2], max(q[2], q[3]) + 1))
+                        qubits.append((q[1], q[2]))
+                    elif q[0] == Q_REG:
+                        repeat = (i, range(0, sizes[q[1]]))
+                        qubits.append((q[1], 0))
+                if repeat is None:
+                    yield opcode, operands, condition, qubits
+                    continue
+                for index in repeat[1]:
+                    qubits[repeat[0]] = (qargs[repeat[0]][1], index)
+                    yield opcode, gate_operands(
+                        name,
+                        cargs,
+                        [(Q_INDEX,) + q for q in qubits],
+                    ), condition, list(qubits)
+            elif opcode == MEASURE:
+                q_name, q_start, q_end, r_name, r_start = operands
+                for i in range(q_end - q_start + 1):
+                    yield MEASURE, (
+                        q_name,
+                        q_start + i,
+                        q_start + i,
+                        r_name,
+                        r_start + i,
+                    ), condition, [(q_name, q_start + i)]
+            elif opcode == MEASURE_REGISTER:
+                q_name, r_name = operands
+                for i in range(sizes[q_name]):
+                    yield MEASURE, (q_name, i, i, r_name, i), condition, [(q_name, i)]
+            elif opcode == RESET:
+                for i in range(sizes[operands[0]]):
+                    yield RESET_QUBIT, (operands[0], i), condition, [(operands[0], i)]
+            elif opcode == RESET_QUBIT:
+                yield opcode, operands, condition, [(operands[0], operands[1])]
+            else:
+                yield opcode, operands, condition, []
+
+    def find_live_ranges(self, instructions, sizes: dict) -> tuple:
+        """
+        Returns the position of the last instruction using each live range of each qubit, and the
+        live ranges that end with the qubit being reset. A live range is a (register, index,
+        generation) tuple, where the generation of a qubit is the number of times it was reset or
+        its register declared before.
+        The state of the qubits of a register declared at the top level of the region is part of
+        its result, so unless their last use measures or resets them, they stay live until the end.
+        Registers declared in an if statement cannot be used after it, so their qubits are not.
+        """
+        last_uses = {}
+        last_opcodes = {}
+        clean = set()
+        generations = {}
+        block_scoped = set()
+        for n, (opcode, operands, condition, qubits) in enumerate(
+            self.expand(instructions, sizes)
+        ):
+            if opcode == QREG:
+                self.next_generation(operands, generations)
+                if condition:
+                    block_scoped.add(operands[0])
+                else:
+                    block_scoped.discard(operands[0])
+            for q in qubits:
+                live_range = q + (generations.get(q, 0),)
+                last_uses[live_range] = n
+                last_opcodes[live_range] = opcode
+                if q[0] in block_scoped:
+                    last_opcodes[live_range] = RESET_QUBIT
+            if opcode == RESET_QUBIT and not condition:
+                q = qubits[0]
+                clean.add(q + (generations.get(q, 0),))
+                generations[q] = generations.get(q, 0) + 1
+        for live_range, opcode in last_opcodes.items():
+            if opcode != MEASURE and opcode != RESET_QUBIT:
+                del last_uses[live_range]
+        return last_uses, clean
+
+    def map_qubits(self, instructions, sizes, last_uses, clean):
+        """Returns the instructions with their qubits mapped, counting the qubits in width"""
+        generations = {}
+        mapping = {}
+        # The qubits that are free, in their initial state or not
+        free_clean = []
+        free_dirty = []
+        for n, (opcode, operands, condition, qubits) in enumerate(
+            self.expand(instructions, sizes)
+        ):
+            if opcode == QREG:
+                self.next_generation(operands, generations)
+                continue
+            # A qubit that was not used since it was declared or reset is still in its initial
+            # state, so resetting it does nothing
+            if opcode == RESET_QUBIT and not condition:
+                q = qubits[0]
+                if q + (generations.get(q, 0),) not in mapping:
+                    generations[q] = generations.get(q, 0) + 1
+                    continue
+            mapped = []
+            for q in qubits:
+                live_range = q + (generations.get(q, 0),)
+                if live_range not in mapping:
+                    if free_clean:
+                        mapping[live_range] = heapq.heappop(free_clean)
+                    elif free_dirty:
+                        mapping[live_range] = heapq.heappop(free_dirty)
+                        yield RESET_QUBIT, (QUBIT_POOL_NAME, mapping[live_range]), ()
+                    else:
+                        mapping[live_range] = self.width
+                        self.width += 1
+                mapped.append(mapping[live_range])
+            if opcode == GATE:
+                name, cargs, _ = gate_arguments(operands)
+                qargs = [(Q_INDEX, QUBIT_POOL_NAME, i) for i in mapped]
+                operands = gate_operands(name, cargs, qargs)
+            elif opcode == MEASURE:
+                operands = (QUBIT_POOL_NAME, mapped[0], mapped[0]) + tuple(operands[3:])
+            elif opcode == RESET_QUBIT:
+                operands = (QUBIT_POOL_NAME, mapped[0])
+            yield opcode, operands, condition
+            for q in qubits:
+                live_range = q + (generations.get(q, 0),)
+                if last_uses.get(live_range) == n and live_range in mapping:
+                    qubit = mapping.pop(live_range)
+                    if live_range in clean:
+                        heapq.heappush(free_clean, qubit)
+                    else:
+                        heapq.heappush(free_dirty, qubit)
+            if opcode == RESET_QUBIT and not condition:
+                generations[qubits[0]] = generations.get(qubits[0], 0) + 1
+
+    # A register that is declared again, in another block, starts with new qubits
+    @staticmethod
+    def next_generation(operands, generations: dict):
+        for i in range(operands[1]):
+            q = (operands[0], i)
+            generations[q] = generations.get(q, 0) + 1
+
+    def report(self) -> str:
+        return "\n".join(
+            "Qubit allocation in region '%s': %d qubits mapped onto %d"
+            % (name, declared, width)
+            for name, (declared, width) in self.widths.items()
+        )
@@ -0,0 +1,364 @@
+from visitor import Transformer
+from builtin_types import Types
+from checker import ErrorChecker
+from computation import ComputationHandler, ConstantFolder
+from errors import CompilerError
+from payloads import UIntPayload
+from state import State
+from symbols import SymbolTable
+
+
+class SemanticAnalyzer(Transformer):
+    """
+    The SemanticAnalyzer does the work of the Resolver, the ErrorChecker and the ComputationHandler in a single walk
+    of the AST: it resolves identifiers, checks for errors, and evaluates constant expressions, raising the same
+    errors as those passes. Since the tree is only walked once, checks that depend on the children of a node are
+    done after the children have been resolved, constant expressions are resolved while they are evaluated, and
+    the qubit allowance of a region is checked once the whole region has been walked, since a register declared
+    late in the region may need a measurement qubit.
+    The error raised is the one the separate passes would raise: the first error of the first pass that finds
+    one. An undefined variable is raised as soon as it is found. Errors of the ErrorChecker and of the
+    ComputationHandler are recorded instead, and the walk goes on resolving identifiers, but no longer does the
+    work of that pass or of the passes after it. The first recorded error is raised once the walk is done.
+    The program state is built during the analysis, and can be read from the state attribute afterwards.
+    """
+
+    def __init__(self, ast):
+        ast.go_to_top()
+        super().__init__(ast.context)
+        self.ast = ast
+        self.state = None
+        # The variables visible from the node being visited
+        self.symbols = SymbolTable()
+        self.folder = ConstantFolder()
+        self.current_region = ""
+        self.in_region = False
+        self.current_function = ""
+        # The function arguments expected by the function call being visited
+        self.call_arguments = []
+        # measured_variables and quantum_var_sizes work the same way as in the ErrorChecker
+        self.measured_variables = []
+        self.quantum_var_sizes = {}
+        # The number of qubits declared so far in the current region, not counting the measurement qubit,
+        # and the first quantum declarations that go over the region's allowance without and with the
+        # measurement qubit
+        self.region_counter = 0
+        self.qubit_max = 0
+        self.over_allowance = None
+        self.over_allowance_with_mbit = None
+        # The first errors of the ErrorChecker and of the ComputationHandler, and whether their work is
+        # still being done
+        self.check_error = None
+        self.fold_error = None
+        self.checking = True
+        self.folding = True
+
+    def traverse(self):
+        # Function calls may refer to functions declared later in the file, so every function and region
+        # is registered before the walk
+        for scope in self.ast.top_level_scope.children:
+            if scope.data == "function":
+                self.ast.add_function(scope.get_name(), scope)
+            elif scope.data == "region":
+                self.ast.add_region(scope.get_name(), scope)
+        self.state = State(self.ast, regions=False)
+        super().traverse()
+        if self.check_error is not None:
+            raise self.check_error
+        if self.fold_error is not None:
+            raise self.fold_error
+        self.state.register_regions()
+
+    # Record an error of the ErrorChecker. The ErrorChecker walks the whole file in order, so the error
+    # that comes first in the file is kept. Nothing is checked or folded after it.
+    def check_failed(self, error: CompilerError):
+        first = self.check_error
+        if first is None or (error.line, error.column) < (first.line, first.column):
+            self.check_error = error
+        self.checking = False
+        self.folding = False
+
+    # Record an error of the ComputationHandler. Nothing is folded after it, but the ErrorChecker, which
+    # runs first, may still find an error later in the file.
+    def fold_failed(self, error: CompilerError):
+        if self.fold_error is None:
+            self.fold_error = error
+        self.folding = False
+
+    # Evaluate a constant expression, or return None if it has an error, which is recorded
+    def fold(self, scope):
+        try:
+            return self.evaluate_expression(scope)
+        except FoldError:
+            return None
+
+    verify_arg_types = ErrorChecker.verify_arg_types
+    verify_one_quantum_arg = ErrorChecker.verify_one_quantum_arg
+    is_const = ComputationHandler.is_const
+    evaluate_expression = ComputationHandler.evaluate_expression
+
+    def transform_function(self, scope):
+        args = scope.get_arg_list()
+        self.symbols.push()
+        for arg in args.get_arguments():
+            self.symbols.declare(scope.register_variable(arg.get_name(), arg.get_type()))
+        self.current_function = scope.get_name().name
+        if self.checking:
+            try:
+                self.verify_arg_types(args)
+                self.verify_one_quantum_arg(args)
+            except CompilerError as e:
+                self.check_failed(e)
+        self.in_region = False
+        return scope
+
+    def after_transform_function(self, scope):
+        self.symbols.pop()
+        self.current_function = ""
+        return scope
+
+    def transform_region(self, scope):
+        self.current_region = scope.get_name().name
+        self.in_region = True
+        self.folder.start_region(self.current_region)
+        self.region_counter = 0
+        self.qubit_max = scope.get_qubit_cap()
+        self.over_allowance = None
+        self.over_allowance_with_mbit = None
+        return scope
+
+    def after_transform_region(self, scope):
+        if self.ast.does_region_need_measurement_qubit(self.current_region):
+            q_decl = self.over_allowance_with_mbit
+            code = "R1N"
+        else:
+            q_decl = self.over_allowance
+            code = "R1"
+        # Qubits are counted even once nothing else is checked, since the declaration that goes over the
+        # allowance may come before the error that was recorded
+        if q_decl is not None:
+            self.check_failed(
+                CompilerError(
+                    code,
+                    q_decl.line,
+                    q_decl.column,
+                    info=(q_decl.get_name().name, self.current_region),
+                )
+            )
+        self.in_region = False
+        self.measured_variables = []
+        return scope
+
+    def transform_block(self, scope):
+        self.symbols.push()
+        return scope
+
+    def after_transform_block(self, scope):
+        self.symbols.pop()
+        for var_name in scope.var_identifiers:
+            if var_name in self.quantum_var_sizes:
+                del self.quantum_var_sizes[var_name]
+        return scope
+
+    def transform_c_decl(self, scope):
+        name = scope.get_name()
+        t = scope.get_type()
+        self.symbols.declare(scope.super_scope.register_variable(name, t))
+        expr = scope.get_expression()
+        if (
+            Types.is_register(t.name)
+            and expr.data == "c_lit"
+            and "1" in scope.get_bits()
+        ):
+            self.ast.region_needs_measurement_qubit(self.current_region)
+
+        if self.checking:
+            try:
+                if not self.in_region:
+                    scope.raise_compiler_error("F0")
+                if Types.is_quantum(t.name):
+                    t.raise_compiler_error("C4")
+                if expr.data == "c_lit" and not Types.is_register(t.name):
+                    expr.raise_compiler_error("C5")
+                elif Types.is_register(t.name) and not expr.data == "c_lit":
+                    expr.raise_compiler_error("C5")
+            except CompilerError as e:
+                self.check_failed(e)
+
+        # Once nothing is folded, the declaration is kept, so that its identifiers are still resolved
+        if t.name == "Const" and self.folding:
+            self.resolve(name)
+            value = self.fold(expr)
+            if value is not None:
+                name.get_symbol().value = value
+                return None
+        return scope
+
+    def transform_q_decl(self, scope):
+        name = scope.get_name()
+        t = scope.get_type()
+        self.symbols.declare(scope.super_scope.register_variable(name, t))
+
+        if self.checking:
+            try:
+                if not self.in_region:
+                    scope.raise_compiler_error("F0")
+                if not Types.is_quantum(t.name) or not Types.is_register(t.name):
+                    t.raise_compiler_error("Q0")
+            except CompilerError as e:
+                self.check_failed(e)
+        length = scope.get_length()
+        self.region_counter += length
+        self.quantum_var_sizes[name.name] = length
+        if self.region_counter > self.qubit_max and self.over_allowance is None:
+            self.over_allowance = scope
+        if (
+            self.region_counter + 1 > self.qubit_max
+            and self.over_allowance_with_mbit is None
+        ):
+            self.over_allowance_with_mbit = scope
+        return scope
+
+    def after_transform_q_slice(self, scope):
+        if not self.checking:
+            return scope
+        name = scope.get_name().name
+        size = self.quantum_var_sizes[name]
+        start, end = scope.get_start_end()
+        if start > size - 1 or end > size - 1:
+            self.check_failed(
+                CompilerError("Q2", scope.line, scope.column, info=(start, end))
+            )
+        return scope
+
+    def after_transform_q_index(self, scope):
+        if not self.checking:
+            return scope
+        name = scope.get_name().name
+        size = self.quantum_var_sizes[name]
+        pos = scope.get_pos()
+        if pos > size - 1:
+            self.check_failed(CompilerError("Q3", scope.line, scope.column, info=pos))
+        return scope
+
+    def transform_measurement(self, scope):
+        if not self.checking:
+            return scope
+        if not self.in_region:
+            self.check_failed(CompilerError("F0", scope.line, scope.column))
+        elif scope.get_q_expr().get_name().name in self.measured_variables:
+            self.check_failed(CompilerError("Q5", scope.line, scope.column))
+        return scope
+
+    def after_transform_measurement(self, scope):
+        if not self.checking:
+            return scope
+        try:
+            self.check_measurement(scope)
+        except CompilerError as e:
+            self.check_failed(e)
+        return scope
+
+    def check_measurement(self, scope):
+        start = scope.get_r_start().value
+        expr = scope.get_q_expr()
+        if expr.data == "q_slice":
+            q_start, q_end = expr.get_start_end()
+        else:
+            q_start = expr.get_pos()
+            q_end = q_start
+        c_size = scope.get_r_name().get_symbol().get_declaration().get_length()
+        q_size = expr.get_name().get_symbol().get_declaration().get_length()
+        slice_range = q_end - q_start
+        if q_end >= q_size or slice_range + q_start >= q_size:
+            if expr.data == "q_slice":
+                scope.raise_compiler_error("Q2", info=(q_start, q_end))
+            else:
+                scope.raise_compiler_error("Q3", info=q_start)
+        elif q_end >= c_size or slice_range + start >= c_size:
+            scope.raise_compiler_error("C3", info=(start, start + slice_range))
+        self.measured_variables.append(expr.get_name().name)
+
+    def transform_function_call(self, scope):
+        if not self.checking:
+            return scope
+        try:
+            self.check_call(scope)
+        except CompilerError as e:
+            self.check_failed(e)
+        return scope
+
+    def check_call(self, scope):
+        name = scope.get_name()
+        if not self.in_region:
+            # Verify the function being called is not itself, to prevent recursion
+            if name.name == self.current_function:
+                scope.raise_compiler_error("F1")
+        self.call_arguments = self.state.get_arguments_for(name)
+        if len(scope.get_call_list().get_arguments()) != len(self.call_arguments):
+            scope.raise_compiler_error("F2")
+
+    def after_transform_function_call(self, scope):
+        if not self.checking:
+            return scope
+        try:
+            self.check_call_arguments(scope)
+        except CompilerError as e:
+            self.check_failed(e)
+        return scope
+
+    def check_call_arguments(self, scope):
+        name = scope.get_name()
+        args = self.call_arguments
+        has_slice = False
+        for i, c_arg in enumerate(scope.get_call_list().get_arguments()):
+            if args[i][1] != c_arg.get_type_name():
+                c_arg.raise_compiler_error(
+                    "F3",
+                    info=(args[i][0], name.name, args[i][1], c_arg.get_type_name()),
+                )
+            if c_arg.data == "q_slice":
+                if has_slice:
+                    c_arg.raise_compiler_error("F9")
+                else:
+                    has_slice = True
+
+    # Link an identifier to the symbol of the variable it refers to
+    def resolve(self, scope):
+        symbol = self.symbols.lookup(scope.name)
+        if symbol is None:
+            scope.raise_compiler_error("V0", info=scope.name)
+        scope.resolve_symbol(symbol)
+        if self.checking and scope.name in self.measured_variables:
+            self.check_failed(CompilerError("Q6", scope.line, scope.column))
+        return symbol
+
+    # Identifiers within constant expressions are not walked, so they are resolved as they are evaluated. An
+    # error in the expression stops its evaluation, and the expression is then walked like any other.
+    def evaluate_value(self, scope):
+        if scope.data == "v_ident":
+            self.resolve(scope)
+        try:
+            return ComputationHandler.evaluate_value(self, scope)
+        except CompilerError as e:
+            self.fold_failed(e)
+            raise FoldError()
+
+    def transform_v_ident(self, scope):
+        symbol = self.resolve(scope)
+        if self.in_region and self.folding and self.is_const(scope):
+            scope.rewrite(UIntPayload(symbol.value))
+        return scope
+
+    def transform_operation(self, scope):
+        if not self.in_region or not self.folding:
+            return scope
+        value = self.fold(scope)
+        if value is not None:
+            scope.rewrite(UIntPayload(value))
+        return scope
+
+
+# Stops the evaluation of a constant expression with an error, which was already recorded
+class FoldError(Exception):
+    pass
@@ -25,9 +25,8 @@ from payloads import (
     UIntPayload,
     VIdentPayload,
 )
-from scope import AST
+from scope import AST, Scope
 from visitor import Visitor
-from math import ceil
 
 
 def token_to_str(t: Token) -> str:
@@ -35,7 +34,7 @@ def token_to_str(t: Token) -> str:
 
 
 def get_line_column(t: Tree) -> (int, int):
-    return ceil(t.meta.line / 2), t.meta.column
+    return t.meta.line, t.meta.column
 
 
 class ASTBuilder(Visitor):
@@ -50,8 +49,7 @@ class ASTBuilder(Visitor):
     def insert_new_scope_and_jump(self, tree, payload=None):
         line, column = get_line_column(tree)
         scope = self.ast.create_sub_scope(line, column, payload=payload)
-        if not self.ast.jump_to(scope.ID):
-            raise Exception("could not jump to scope")
+        self.ast.jump_into(scope)
 
     def visit_function_def(self, t):
         self.insert_new_scope_and_jump(t, payload=FunctionPayload())
@@ -126,8 +124,7 @@ class ASTBuilder(Visitor):
     def visit_assignment(self, t):
         line, column = get_line_column(t)
         scope = self.ast.create_sub_scope(line, column, payload=AssignmentPayload())
-        if not self.ast.jump_to(scope.ID):
-            raise Exception("could not jump to scope")
+        self.ast.jump_into(scope)
 
     def after_visit_assignment(self, _):
         self.ast.jump_super()
@@ -237,3 +234,220 @@ class ASTBuilder(Visitor):
 
     def after_visit_measurement(self, _):
         self.ast.jump_super()
+
+
+class InlineASTBuilder:
+    """
+    The InlineASTBuilder builds the same AST as the ASTBuilder, but does so while the input is
+    being parsed: it is given to the LALR parser as its transformer, and each method is called
+    with the already built children of a grammar rule, so no parse tree is ever created.
+    The parser must keep all tokens, so that nodes get the position of their first token.
+    Lists of call or function arguments are passed up as Python lists until they are complete.
+    """
+
+    def is_node(self, c) -> bool:
+        return isinstance(c, Scope)
+
+    def node_position(self, node) -> (int, int):
+        return node.line, node.column
+
+    def first_position(self, children) -> (int, int):
+        """Returns the line and column of the first token in a list of parsed children"""
+        # Nested lists are walked with an explicit stack of iterators instead of recursion. Children
+        # may be None, so the stack itself marks the end of a list.
+        stack = [iter(children)]
+        while stack:
+            c = next(stack[-1], stack)
+            if c is stack:
+                stack.pop()
+            elif isinstance(c, Token):
+                return c.line, c.column
+            elif self.is_node(c):
+                return self.node_position(c)
+            elif isinstance(c, (list, tuple)):
+                stack.append(iter(c))
+        raise Exception("No position for parsed children")
+
+    def new_scope(self, children, payload, sub_scopes=()) -> Scope:
+        line, column = self.first_position(children)
+        scope = Scope(line, column, scope_payload=payload)
+        for s in sub_scopes:
+            scope.adopt_sub_scope(s)
+        return scope
+
+    def scopes_in(self, children) -> list:
+        return [c for c in children if self.is_node(c)]
+
+    def start(self, children):
+        return self.to_ast(children)
+
+    def to_ast(self, items) -> AST:
+        ast = AST()
+        if self.is_node(items):
+            # A single top level statement is not wrapped by the parser
+            items = [items]
+        for item in items:
+            ast.top_level_scope.adopt_sub_scope(item)
+        return ast
+
+    def top_level_stmt(self, children):
+        return children[0]
+
+    def region(self, children):
+        return self.new_scope(children, RegionPayload(), self.scopes_in(children))
+
+    def function_def(self, children):
+        sub_scopes = []
+        for c in children:
+            if self.is_node(c):
+                sub_scopes.append(c)
+            elif isinstance(c, list):
+                sub_scopes.append(self.new_scope(c, ArgListPayload(), c))
+        return self.new_scope(children, FunctionPayload(), sub_scopes)
+
+    def function_call(self, children):
+        name, call_list = children[0], children[2]
+        call_list = self.new_scope(call_list, CallListPayload(), call_list)
+        return self.new_scope(children, FunctionCallPayload(), [name, call_list])
+
+    def call_list(self, children):
+        if len(children) == 1:
+            return [children[0]]
+        return [children[0]] + children[2]
+
+    def arg_list(self, children):
+        return self.call_list(children)
+
+    def arg(self, children):
+        return self.new_scope(children, ArgPayload(), self.scopes_in(children))
+
+    def r_ident(self, children):
+        return self.new_scope(children, RIdentPayload(token_to_str(children[0])))
+
+    def f_ident(self, children):
+        # Function identifiers and variable identifiers must be put
+        # in lowercase to work in OpenQASM
+        return self.new_scope(children, FIdentPayload(token_to_str(children[0]).lower()))
+
+    def v_ident(self, children):
+        return self.new_scope(children, VIdentPayload(token_to_str(children[0]).lower()))
+
+    def type(self, children):
+        return self.new_scope(children, TypePayload(token_to_str(children[0])))
+
+    def uint(self, children):
+        return self.new_scope(children, UIntPayload(int(token_to_str(children[0]))))
+
+    def block(self, children):
+        return self.new_scope(children, BlockPayload(), self.scopes_in(children))
+
+    def stmt(self, children):
+        return children[0]
+
+    def declaration(self, children):
+        return self.new_scope(children, ClassicalDeclarationPayload(), self.scopes_in(children))
+
+    def q_declaration(self, children):
+        return self.new_scope(children, QuantumDeclarationPayload(), self.scopes_in(children))
+
+    def measurement(self, children):
+        return self.new_scope(children, MeasurementPayload(), self.scopes_in(children))
+
+    def c_lit(self, children):
+        return self.new_scope(children, ClassicalLiteralPayload(), self.scopes_in(children))
+
+    def q_lit(self, children):
+        return self.new_scope(children, QuantumLiteralPayload(), self.scopes_in(children))
+
+    def bit(self, children):
+        return self.new_scope(children, BitPayload(children[0].value == "1"))
+
+    def expr(self, children):
+        return children[0]
+
+    def if_statement(self, children):
+        return self.new_scope(children, IfPayload(), self.scopes_in(children))
+
+    def b_expr(self, children):
+        op, left, right = children[0]
+        return self.new_scope(children, BoolOpPayload(op), [left, right])
+
+    def eq(self, children):
+        return "eq", children[0], children[2]
+
+    def neq(self, children):
+        return "neq", children[0], children[2]
+
+    def greater(self, children):
+        return "greater", children[0], children[2]
+
+    def lesser(self, children):
+        return "lesser", children[0], children[2]
+
+    def operation(self, op, children):
+        return self.new_scope(children, OpPayload(op), [children[0], children[2]])
+
+    def sum(self, children):
+        return children[0]
+
+    def add(self, children):
+        return self.operation("add", children)
+
+    def sub(self, children):
+        return self.operation("sub", children)
+
+    def product(self, children):
+        return children[0]
+
+    def mul(self, children):
+        return self.operation("mul", children)
+
+    def div(self, children):
+        return self.operation("div", children)
+
+    def atomic(self, children):
+        return children[0]
+
+    def paren(self, children):
+        return children[1]
+
+    def q_expr(self, children):
+        return children[0]
+
+    def q_slice(self, children):
+        return self.new_scope(children, QuantumSlicePayload(), self.scopes_in(children))
+
+    def q_index(self, children):
+        return self.new_scope(children, QuantumIndexPayload(), self.scopes_in(children))
+
+
+class ArenaASTBuilder(InlineASTBuilder):
+    """
+    An InlineASTBuilder that stores the AST in an ASTArena instead of creating Scope objects.
+    Nodes are passed between rules as their index in the arena. A new arena has to be assigned
+    to 'arena' before each parse.
+    """
+
+    def __init__(self):
+        self.arena = None
+
+    def is_node(self, c) -> bool:
+        return isinstance(c, int)
+
+    def node_position(self, node) -> (int, int):
+        return self.arena.lines[node], self.arena.columns[node]
+
+    def new_scope(self, children, payload, sub_scopes=()) -> int:
+        line, column = self.first_position(children)
+        return self.arena.add_node(payload, line, column, sub_scopes)
+
+    def to_ast(self, items) -> AST:
+        if self.is_node(items):
+            items = [items]
+        for item in items:
+            self.arena.append_child(0, item)
+        return AST(self.arena.view(0))
+
+
+# 'if' is a Python keyword, so the method for the 'if' rule has to be set by name
+setattr(InlineASTBuilder, "if", InlineASTBuilder.if_statement)
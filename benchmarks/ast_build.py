@@ -0,0 +1,50 @@
+"""
+Measures how long the ASTBuilder takes to build regions with a growing number of statements.
+The time per statement should stay roughly the same as the region grows. The garbage collector
+is paused while timing, since its full collections over the growing heap would otherwise hide
+the cost of the builder itself.
+
+Usage: python benchmarks/ast_build.py [STATEMENTS ...]
+"""
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ast_builder import ASTBuilder  # noqa: E402
+from input_parser import parse  # noqa: E402
+
+
+def region_with_statements(statements: int) -> str:
+    body = "  hadamard(q[0]);\n" * statements
+    return "region Bench<1> {\n  Q[] q = ^0^;\n" + body + "}\n"
+
+
+def time_build(statements: int) -> float:
+    tree = parse(region_with_statements(statements), mode="lalr")
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        builder = ASTBuilder(tree)
+        builder.traverse()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def main(sizes):
+    print("statements  build time (s)  per statement (us)")
+    for size in sizes:
+        t = time_build(size)
+        print("%10d  %14.3f  %18.2f" % (size, t, t / size * 1e6))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main([int(a) for a in sys.argv[1:]])
+    else:
+        main([12500, 25000, 50000, 100000])
@@ -126,9 +126,8 @@ class ErrorChecker(Visitor):
             else:
                 q_start = expr.get_pos()
                 q_end = q_start
-            r_name = scope.get_r_name().name
-            c_size = scope.get_scope_for(r_name).super_scope.get_length()
-            q_size = scope.get_scope_for(name).super_scope.get_length()
+            c_size = scope.get_r_name().get_symbol().get_declaration().get_length()
+            q_size = expr.get_name().get_symbol().get_declaration().get_length()
             slice_range = q_end - q_start
             if q_end >= q_size or slice_range + q_start >= q_size:
                 if expr.data == "q_slice":
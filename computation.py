@@ -1,9 +1,71 @@
 from visitor import Transformer
 from builtin_types import Types
 from payloads import UIntPayload
-from scope import Scope
 import operator
 
+OPERATIONS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.floordiv,
+}
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+class ConstantFolder:
+    """
+    The ConstantFolder evaluates constant expressions, and counts, for each region, how many operations were folded.
+    """
+
+    def __init__(self):
+        # Maps each region name to the number of operations folded in it
+        self.stats = {}
+        self.region_name = None
+
+    def start_region(self, name):
+        self.region_name = name
+        self.stats[name] = 0
+
+    # Operations are evaluated with an explicit stack instead of recursion, so that long expressions
+    # do not hit Python's recursion limit. Operands are evaluated left to right, with evaluate_value.
+    def evaluate(self, scope, evaluate_value):
+        # The values of the evaluated operands whose operation has not been evaluated yet
+        values = []
+        # Each entry is a node, and whether its operands have already been evaluated
+        stack = [(scope, False)]
+        folded = 0
+        while stack:
+            s, evaluated = stack.pop()
+            if s.data != "operation":
+                values.append(evaluate_value(s))
+            elif evaluated:
+                arg2 = values.pop()
+                arg1 = values.pop()
+                values.append(OPERATIONS[s.get_operation()](arg1, arg2))
+                folded += 1
+            else:
+                arg1, arg2 = s.get_operands()
+                stack.append((s, True))
+                stack.append((arg2, False))
+                stack.append((arg1, False))
+        if self.region_name is not None:
+            self.stats[self.region_name] += folded
+        return values[0]
+
+    def report(self) -> str:
+        lines = []
+        for name, folded in self.stats.items():
+            lines.append(
+                "Constant folding in region '%s': %d operations folded" % (name, folded)
+            )
+        return "\n".join(lines)
+
 
 class ComputationHandler(Transformer):
     """
@@ -18,9 +80,11 @@ class ComputationHandler(Transformer):
         super().__init__(ast.context)
 
         self.in_region = False
+        self.folder = ConstantFolder()
 
     def transform_region(self, scope):
         self.in_region = True
+        self.folder.start_region(scope.get_name().name)
         return scope
 
     def transform_function(self, scope):
@@ -28,10 +92,10 @@ class ComputationHandler(Transformer):
         return scope
 
     def is_const(self, scope):
-        typename = scope.get_type_for(scope.name).name
+        typename = scope.get_type_name()
         return Types.is_classical(typename) and not Types.is_register(typename)
 
-    def evaluate_expression(self, scope):
+    def evaluate_value(self, scope):
         if scope.data == "uint":
             return scope.value
         elif scope.data == "v_ident":
@@ -39,28 +103,17 @@ class ComputationHandler(Transformer):
                 scope.raise_compiler_error("Q7")
             elif Types.is_register(scope.get_type_name()):
                 scope.raise_compiler_error("C6")
-            return scope.get_classical_value(scope.name)
-        elif scope.data == "operation":
-            op = scope.get_operation()
-            arg1, arg2 = scope.get_operands()
-            operation = {
-                "+": operator.add,
-                "-": operator.sub,
-                "*": operator.mul,
-                "/": operator.floordiv,
-            }[op]
-            return operation(
-                self.evaluate_expression(arg1), self.evaluate_expression(arg2)
-            )
+            return scope.get_symbol().value
+
+    def evaluate_expression(self, scope):
+        return self.folder.evaluate(scope, self.evaluate_value)
 
     def transform_c_decl(self, scope):
         if not self.in_region:
             return scope
         if scope.get_type().name == "Const":
             expr = scope.get_expression()
-            scope.set_classical_value(
-                scope.get_name().name, self.evaluate_expression(expr)
-            )
+            scope.get_name().get_symbol().value = self.evaluate_expression(expr)
             return None
         else:
             return scope
@@ -69,25 +122,12 @@ class ComputationHandler(Transformer):
         if not self.in_region:
             return scope
         if self.is_const(scope):
-            value = scope.get_classical_value(scope.name)
-            s = Scope(
-                scope.line,
-                scope.column,
-                scope_payload=UIntPayload(value),
-                super_scope=scope.super_scope,
-            )
-            return s
-        else:
-            return scope
+            scope.rewrite(UIntPayload(scope.get_symbol().value))
+        return scope
 
     def transform_operation(self, scope):
         if not self.in_region:
             return scope
         value = self.evaluate_expression(scope)
-        s = Scope(
-            scope.line,
-            scope.column,
-            scope_payload=UIntPayload(value),
-            super_scope=scope.super_scope,
-        )
-        return s
+        scope.rewrite(UIntPayload(value))
+        return scope
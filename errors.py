@@ -93,6 +93,11 @@ class CompilerError(Exception):
         self.column = column
         self.info = info
 
+    # Errors raised while compiling in another process are pickled, which needs the arguments
+    # that __init__ takes
+    def __reduce__(self):
+        return CompilerError, (self.error_code, self.line, self.column, self.info)
+
     def __repr__(self):
         _repr = "\n"
         msg = ErrorRegistry.get_error(self.error_code, self.info)
@@ -0,0 +1,97 @@
+import hashlib
+import re
+from lark import UnexpectedInput
+from ast_builder import ASTBuilder
+from input_parser import DEFAULT_PARSER_MODE, parse, read_source
+from scope import AST
+
+# Comments, braces, newlines and runs of any other visible characters
+CHUNK_TOKENS = re.compile(r"//[^\n]*|[{}\n]|[^\s{}/]+|/")
+
+
+def split_top_level(contents: str) -> list:
+    """
+    Splits source code into chunks of whole lines, where each chunk holds one or more complete
+    top-level regions or functions. Returns a list of (start line, chunk text) pairs.
+    """
+    chunks = []
+    depth = 0
+    line = 1
+    chunk_start = 0
+    chunk_line = 1
+    # item_closed is True when a top-level item was closed on the current line, and only
+    # whitespace or comments have followed it
+    item_closed = False
+    for m in CHUNK_TOKENS.finditer(contents):
+        t = m.group()
+        if t == "{":
+            depth += 1
+            item_closed = False
+        elif t == "}":
+            depth -= 1
+            item_closed = depth == 0
+        elif t == "\n":
+            line += 1
+            if item_closed:
+                chunks.append((chunk_line, contents[chunk_start : m.end()]))
+                chunk_start = m.end()
+                chunk_line = line
+                item_closed = False
+        elif not t.startswith("//"):
+            item_closed = False
+    if chunk_start < len(contents):
+        chunks.append((chunk_line, contents[chunk_start:]))
+    return chunks
+
+
+class IncrementalParser:
+    """
+    The IncrementalParser turns source code into an AST, like parsing and running the ASTBuilder
+    would, but remembers the AST built for each top-level chunk of the source. When the same source
+    is parsed again, only chunks whose text changed are parsed and built; the rest are copied from
+    the cache. The AST is always copied, since later compilation steps modify it.
+    """
+
+    def __init__(self, mode=DEFAULT_PARSER_MODE):
+        self.mode = mode
+        # Maps the hash of a chunk's text to the top-level scopes built from it
+        self.chunks = {}
+        # The number of chunks that had to be parsed during the last call to parse()
+        self.chunks_parsed = 0
+
+    def parse_file(self, f_name: str) -> AST:
+        return self.parse(read_source(f_name))
+
+    def parse(self, contents: str) -> AST:
+        ast = AST()
+        chunks = {}
+        self.chunks_parsed = 0
+        for start_line, text in split_top_level(contents):
+            key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            if key in chunks:
+                items = chunks[key]
+            elif key in self.chunks:
+                items = self.chunks[key]
+            else:
+                items = self.build_chunk(text, start_line)
+                self.chunks_parsed += 1
+            chunks[key] = items
+            for item in items:
+                ast.top_level_scope.sub_scopes.append(
+                    item.clone(ast.top_level_scope, line_offset=start_line - 1)
+                )
+        # Only chunks that are still in the source are kept
+        self.chunks = chunks
+        return ast
+
+    def build_chunk(self, text: str, start_line: int) -> list:
+        try:
+            tree = parse(text, mode=self.mode)
+        except UnexpectedInput as u:
+            # Make the error position relative to the whole source
+            if u.line > 0:
+                u.line += start_line - 1
+            raise u
+        builder = ASTBuilder(tree)
+        builder.traverse()
+        return builder.ast.top_level_scope.sub_scopes
@@ -0,0 +1,177 @@
+from qasm import (
+    C_REG,
+    GATE,
+    QREG,
+    Q_INDEX,
+    Q_REG,
+    Q_SLICE,
+    InstructionList,
+    gate_arguments,
+    gate_operands,
+)
+
+# How much the code of a region or function may grow when calls to a function are inlined, for
+# each level of --inline. Level 1 only inlines when the code does not grow.
+INLINE_GROWTH = {0: 0, 1: 1, 2: 2}
+
+
+class Inliner:
+    """
+    The Inliner replaces calls to user functions with the instructions of the functions, when a cost
+    model finds it worthwhile. For each region or function, the cost of keeping a function as a gate
+    is the number of lines of its definition plus the number of lines calling it, and the cost of
+    inlining it is the number of lines its instructions take once copied at every call. A function is
+    inlined if that is at most the cost of keeping it, times the growth allowed by the level. Small
+    functions and functions called once are inlined, while larger ones called often are kept.
+    A call whose slice is repeated over several qubits is inlined once for each qubit, in order.
+    Only functions made of unconditional gates can be inlined.
+    Functions are inlined into other functions first, with inline_gates(), so that their cost is known
+    before they are inlined into regions.
+    """
+
+    def __init__(self, gates: dict, level: int = 1):
+        self.gates = gates
+        self.growth = INLINE_GROWTH[level]
+        # The bodies of the functions that can be inlined, as lists of GATE operands, by name
+        self.bodies = {}
+        # The functions whose calls have been inlined already
+        self.done = set()
+        # The number of calls inlined, by function name
+        self.inlined = {}
+
+    def inline_gates(self):
+        for name in self.gates.keys():
+            self.inline_gate(name, set())
+
+    # Functions are inlined into a function after the functions it calls. Functions that call
+    # each other are not inlined into each other.
+    def inline_gate(self, name, visiting: set):
+        if name in self.done or name in visiting:
+            return
+        visiting.add(name)
+        gate = self.gates[name]
+        for opcode, operands, _ in gate.instructions:
+            if opcode == GATE and operands[0] in self.gates:
+                self.inline_gate(operands[0], visiting)
+        instructions = self.inline_instructions(gate.instructions)
+        if instructions is not None:
+            gate.instructions = instructions
+        self.done.add(name)
+
+    def inline_program(self, program):
+        instructions = self.inline_instructions(program.instructions)
+        if instructions is not None:
+            program.instructions = instructions
+        program.dependencies = self.find_dependencies(program.instructions)
+
+    # Returns the GATE operands of the instructions of a function, or None if it cannot be inlined
+    def body(self, name):
+        if name not in self.bodies:
+            body = []
+            for opcode, operands, condition in self.gates[name].instructions:
+                if opcode != GATE or condition or operands[0] == name:
+                    body = None
+                    break
+                body.append(operands)
+            self.bodies[name] = body
+        return self.bodies[name]
+
+    # Returns the instructions with the calls worth inlining replaced, or None if none are
+    def inline_instructions(self, instructions):
+        # The sizes of the registers declared so far, since a call with a whole register is
+        # repeated over each of its qubits
+        sizes = {}
+        keep_cost = {}
+        inline_cost = {}
+        for opcode, operands, _ in instructions:
+            if opcode == QREG:
+                sizes[operands[0]] = operands[1]
+            elif opcode == GATE and operands[0] in self.gates:
+                body = self.body(operands[0])
+                if body is None:
+                    continue
+                name, _, qargs = gate_arguments(operands)
+                repeat = self.repeated_qubits(qargs, sizes)
+                copies = 1 if repeat is None else len(repeat[1])
+                # A call broadcast over a whole register is a single line
+                if repeat is not None and qargs[repeat[0]][0] == Q_REG:
+                    lines = 1
+                else:
+                    lines = copies
+                keep_cost[name] = keep_cost.get(name, len(body) + 2) + lines
+                inline_cost[name] = inline_cost.get(name, 0) + len(body) * copies
+        names = {n for n in keep_cost if inline_cost[n] <= keep_cost[n] * self.growth}
+        if not names:
+            return None
+        inlined = InstructionList()
+        inlined.extend(self.expand(instructions, names))
+        return inlined
+
+    def expand(self, instructions, names: set):
+        sizes = {}
+        for opcode, operands, condition in instructions:
+            if opcode == QREG:
+                sizes[operands[0]] = operands[1]
+            if opcode != GATE or operands[0] not in names:
+                yield opcode, operands, condition
+                continue
+            name, cargs, qargs = gate_arguments(operands)
+            gate = self.gates[name]
+            self.inlined[name] = self.inlined.get(name, 0) + 1
+            arguments = dict(zip(gate.cargs, cargs))
+            repeat = self.repeated_qubits(qargs, sizes)
+            qubits = [self.first_qubit(q) for q in qargs]
+            for index in [None] if repeat is None else repeat[1]:
+                if index is not None:
+                    qubits[repeat[0]] = (Q_INDEX, qargs[repeat[0]][1], index)
+                arguments.update(zip(gate.qargs, qubits))
+                for body_operands in self.body(name):
+                    yield GATE, self.substitute(body_operands, arguments), condition
+
+    # Returns the position of the argument a call is repeated over, and the indexes of its qubits,
+    # or None if the call is not repeated. Like emit_gate, this is the last slice, or a whole
+    # register if the call was broadcast over one.
+    @staticmethod
+    def repeated_qubits(qargs, sizes):
+        repeat = None
+        for i, q in enumerate(qargs):
+            if q[0] == Q_SLICE:
+                repeat = (i, range(q[2], max(q[2], q[3]) + 1))
+            elif q[0] == Q_REG and q[1] in sizes:
+                repeat = (i, range(0, sizes[q[1]]))
+        return repeat
+
+    # A slice that is not repeated stands for its first qubit
+    @staticmethod
+    def first_qubit(qarg):
+        if qarg[0] == Q_SLICE:
+            return Q_INDEX, qarg[1], qarg[2]
+        return qarg
+
+    # Replace the arguments of a gate that are parameters of the function being inlined
+    @staticmethod
+    def substitute(operands, arguments: dict) -> list:
+        name, cargs, qargs = gate_arguments(operands)
+        cargs = [arguments.get(c[1], c) if c[0] == C_REG else c for c in cargs]
+        qargs = [arguments.get(q[1], q) if q[0] == Q_REG else q for q in qargs]
+        return gate_operands(name, cargs, qargs)
+
+    def find_dependencies(self, instructions) -> set:
+        """Returns the functions called by the instructions, and the functions they call in turn"""
+        dependencies = set()
+        stack = [instructions]
+        while stack:
+            for opcode, operands, _ in stack.pop():
+                name = operands[0]
+                if opcode == GATE and name in self.gates and name not in dependencies:
+                    dependencies.add(name)
+                    stack.append(self.gates[name].instructions)
+        return dependencies
+
+    def report(self) -> str:
+        if not self.inlined:
+            return ""
+        return "Function inlining: %d calls inlined (%s)" % (
+            sum(self.inlined.values()),
+            ", ".join("%s: %d" % (n, c) for n, c in self.inlined.items()),
+        )
@@ -1,22 +1,221 @@
-from lark import Lark, Tree
+import hashlib
+import io
+import mmap
+import os
+import pickle
+import stat
+import tempfile
+from lark import Lark, Tree, __version__ as LARK_VERSION
+from lark.exceptions import GrammarError
+from ast_builder import ArenaASTBuilder, InlineASTBuilder
+from scope import AST, ASTArena
 
 GRAMMAR_FILE = "grammar.lark"
+LALR_GRAMMAR_FILE = "grammar_lalr.lark"
 
+# The available parsing modes. "lalr" is the fast, linear time parser, "earley" is
+# the original (slower) parser, and "auto" uses LALR whenever the grammar allows it,
+# falling back to Earley otherwise.
+PARSER_MODES = ["auto", "lalr", "earley"]
+DEFAULT_PARSER_MODE = "auto"
 
-def grammar() -> str:
+EARLEY_OPTIONS = {"parser": "earley", "propagate_positions": True, "lexer": "dynamic"}
+LALR_OPTIONS = {"parser": "lalr", "propagate_positions": True, "lexer": "contextual"}
+# The parser that builds the AST directly needs every token to know the position of each node
+DIRECT_OPTIONS = {"parser": "lalr", "keep_all_tokens": True, "lexer": "contextual"}
+
+
+def default_parser_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "funq")
+
+
+# Built LALR parsers are serialized to this folder, so later runs can load the parse
+# tables instead of rebuilding them. Loading a parser unpickles it, so the folder is
+# private to the user, and is only used while nobody else can write to it. Setting
+# this to None disables the cache.
+PARSER_CACHE_DIR = os.environ.get("FUNQ_PARSER_CACHE", default_parser_cache_dir())
+
+# Files at least this large (in bytes) are memory-mapped and decoded directly from the
+# mapping, instead of being read into an intermediate buffer first.
+MMAP_THRESHOLD = 1 << 20
+
+# Parsers that have already been built, by mode. Parsers are only built when they
+# are first used.
+PARSERS = {}
+
+# The transformer of the parser that builds ASTs in an ASTArena
+ARENA_BUILDER = ArenaASTBuilder()
+
+
+def grammar(file_name=None) -> str:
     global GRAMMAR_FILE
-    with open(GRAMMAR_FILE) as f:
+    if file_name is None:
+        file_name = GRAMMAR_FILE
+    with open(file_name) as f:
         return "\n".join(f.readlines())
 
 
-PARSER = Lark(grammar(), parser="earley", propagate_positions=True, lexer="dynamic")
+def parser_cache_file(grammar_text: str, options: dict) -> str:
+    """Returns the cache file for a parser, keyed by the grammar, options and Lark version"""
+    key = hashlib.sha256(
+        (grammar_text + repr(sorted(options.items())) + LARK_VERSION).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(PARSER_CACHE_DIR, "lalr-" + LARK_VERSION + "-" + key + ".pickle")
+
+
+def is_private(st) -> bool:
+    """Returns whether a file or folder is owned by the user, and not writable by others"""
+    if not hasattr(os, "getuid"):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def private_cache_dir() -> bool:
+    """Creates the parser cache folder if needed, and returns whether it is private"""
+    try:
+        os.makedirs(PARSER_CACHE_DIR, mode=0o700, exist_ok=True)
+        return is_private(os.stat(PARSER_CACHE_DIR))
+    except OSError:
+        return False
+
+
+def load_parser(f, transformer=None) -> Lark:
+    if transformer is None:
+        return Lark.load(f)
+    # Lark.load() takes no options, but the loader it calls accepts a transformer
+    return Lark.__new__(Lark)._load(f, transformer=transformer)
+
+
+def build_cached_parser(grammar_text: str, options: dict, transformer=None) -> Lark:
+    """
+    Builds a parser, or loads it from the cache. Parsers are saved without their transformer, which
+    is attached when they are loaded, so that it is never pickled.
+    """
+    if PARSER_CACHE_DIR is None or not private_cache_dir():
+        return Lark(grammar_text, transformer=transformer, **options)
+    cache_file = parser_cache_file(grammar_text, options)
+    try:
+        with open(cache_file, "rb") as f:
+            if is_private(os.fstat(f.fileno())):
+                return load_parser(f, transformer=transformer)
+    except FileNotFoundError:
+        pass
+    except (OSError, EOFError, pickle.UnpicklingError):
+        # An unreadable or broken cache file is replaced by the rebuilt parser below
+        pass
+    parser = Lark(grammar_text, **options)
+    saved = io.BytesIO()
+    parser.save(saved)
+    try:
+        # Write to a temporary file first, so that other compiler processes never
+        # see a partially written cache file. The file is only readable by the user.
+        fd, tmp_name = tempfile.mkstemp(dir=PARSER_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(saved.getbuffer())
+        os.replace(tmp_name, cache_file)
+    except OSError:
+        pass
+    if transformer is None:
+        return parser
+    # The parse tables are not built again, but loaded from the saved parser
+    saved.seek(0)
+    return load_parser(saved, transformer=transformer)
+
+
+def build_parser(mode: str) -> Lark:
+    if mode == "earley":
+        return Lark(grammar(GRAMMAR_FILE), **EARLEY_OPTIONS)
+    elif mode == "lalr":
+        return build_cached_parser(grammar(LALR_GRAMMAR_FILE), LALR_OPTIONS)
+    elif mode == "auto":
+        try:
+            return build_parser("lalr")
+        except GrammarError:
+            return build_parser("earley")
+    else:
+        raise Exception("Unknown parser mode: " + mode)
+
+
+def get_parser(mode: str = DEFAULT_PARSER_MODE) -> Lark:
+    if mode not in PARSERS:
+        PARSERS[mode] = build_parser(mode)
+    return PARSERS[mode]
+
+
+def read_source(f_name: str) -> str:
+    """Reads the contents of a source file, memory-mapping it if it is large"""
+    with open(f_name, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+            return f.read().decode("utf-8")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return str(m, "utf-8")
+
+
+def read_stream(stream) -> str:
+    """Reads the contents of a file-like object (such as sys.stdin or io.StringIO)"""
+    contents = stream.read()
+    if isinstance(contents, bytes):
+        contents = contents.decode("utf-8")
+    return contents
+
+
+def get_direct_parser(arena: bool = False) -> Lark:
+    """
+    Returns the LALR parser that builds the AST while parsing, instead of a parse tree.
+    If arena is True, the parser stores the AST in an ASTArena.
+    Both parsers load the same cached parser, with their own transformer.
+    """
+    if arena:
+        if "arena" not in PARSERS:
+            PARSERS["arena"] = build_cached_parser(
+                grammar(LALR_GRAMMAR_FILE), DIRECT_OPTIONS, transformer=ARENA_BUILDER
+            )
+        return PARSERS["arena"]
+    if "direct" not in PARSERS:
+        PARSERS["direct"] = build_cached_parser(
+            grammar(LALR_GRAMMAR_FILE), DIRECT_OPTIONS, transformer=InlineASTBuilder()
+        )
+    return PARSERS["direct"]
+
+
+def parse_file(f_name: str, mode: str = DEFAULT_PARSER_MODE) -> Tree:
+    return parse(read_source(f_name), mode=mode)
+
+
+def parse_stream(stream, mode: str = DEFAULT_PARSER_MODE) -> Tree:
+    return parse(read_stream(stream), mode=mode)
+
+
+def parse(contents: str, mode: str = DEFAULT_PARSER_MODE) -> Tree:
+    return get_parser(mode).parse(contents)
+
+
+def build_ast_from_file(f_name: str, arena: bool = False) -> AST:
+    return build_ast(read_source(f_name), arena=arena)
 
 
-def parse_file(f_name: str) -> Tree:
-    with open(f_name) as f:
-        contents = "\n".join(f.readlines())
-        return parse(contents)
+def build_ast_from_stream(stream, arena: bool = False) -> AST:
+    return build_ast(read_stream(stream), arena=arena)
 
 
-def parse(contents: str) -> Tree:
-    return PARSER.parse(contents)
+def build_ast(contents: str, arena: bool = False) -> AST:
+    """
+    Parses the contents and returns the AST, without creating a parse tree in between.
+    If arena is True, the nodes of the AST are stored in an ASTArena instead of as Scope objects.
+    """
+    if arena:
+        ARENA_BUILDER.arena = ASTArena()
+        try:
+            result = get_direct_parser(arena=True).parse(contents)
+            if isinstance(result, AST):
+                return result
+            return ARENA_BUILDER.to_ast(result)
+        finally:
+            ARENA_BUILDER.arena = None
+    result = get_direct_parser().parse(contents)
+    if isinstance(result, AST):
+        return result
+    return InlineASTBuilder().to_ast(result)
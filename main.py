@@ -1,16 +1,33 @@
-from sys import argv
+from sys import argv, stderr, stdin, stdout
+from allocator import QubitAllocator
+from analysis import SemanticAnalyzer
 from ast_builder import ASTBuilder
 from checker import ErrorChecker
 from computation import ComputationHandler
 from errors import CompilerError
 from output import Output
-from input_parser import parse_file
+from parallel import compile_regions
+from pruner import BranchPruner
+import input_parser
+from inliner import INLINE_GROWTH, Inliner
+from optimizer import OPTIMIZATION_LEVELS, PeepholeOptimizer
+from input_parser import (
+    DEFAULT_PARSER_MODE,
+    PARSER_MODES,
+    build_ast_from_file,
+    build_ast_from_stream,
+    parse_file,
+    parse_stream,
+)
 from resolver import Resolver
 from state import State
-from transpiler import Transpiler
+from transpiler import (
+    CLASSICAL_INITIALIZATIONS,
+    DEFAULT_CLASSICAL_INITIALIZATION,
+    Transpiler,
+)
 from pathlib import Path
-from lark import UnexpectedCharacters
-from math import ceil
+from lark import UnexpectedCharacters, UnexpectedInput
 
 
 class CommandLineInterface:
@@ -21,7 +38,7 @@ class CommandLineInterface:
 
     help_screen = """
 Usage: <PROGRAM> <INPUT> [OPTIONS]
-where <INPUT> is a valid relative or absolute filename.
+where <INPUT> is a valid relative or absolute filename, or '-' to read the program from STDIN.
 
 The funq compiler compiles a file of Funq code into a set of OpenQASM files,
 each one for a specific region (circuit). Below are some options for this
@@ -36,6 +53,32 @@ Options:
                                                     saving it to a file.
 --no-default-save                              -> Tells the compiler to not output any files by default, besides the ones
                                                     specifically defined. 
+-p <MODE>, --parser <MODE>                     -> Selects the parser used for the input file: 'lalr', 'earley' or 'auto'
+                                                    (default is 'auto', which uses LALR whenever the grammar allows it)
+--no-parser-cache                              -> Always rebuilds the parser instead of loading it from the on-disk cache
+--direct-ast                                   -> Builds the abstract syntax tree while parsing, without creating a parse
+                                                    tree first (uses the LALR parser)
+--fused-analysis                               -> Resolves identifiers, checks for errors and evaluates constants in a single
+                                                    walk of the abstract syntax tree, instead of one walk for each
+-j <N>, --jobs <N>                             -> Checks and compiles regions in up to N processes at the same time
+                                                    (default is 1). Where processes cannot be forked, the regions
+                                                    are compiled one after the other, which --debug reports
+--inline <LEVEL>                               -> Replaces calls to small or rarely called functions with their
+                                                    instructions: 0 never does (default), 1 only does when the
+                                                    output does not grow, and 2 allows it to grow up to twice as large
+-O0, -O1, -O2                                  -> Sets how much the generated instructions are optimized: -O0 leaves them
+                                                    as they are (default), -O1 cancels and merges gates that directly
+                                                    follow each other, and -O2 also does across gates on other qubits
+--reuse-qubits                                 -> Maps the qubits of each region onto as few qubits as possible, by
+                                                    reusing qubits that are no longer used
+--creg-init <STRATEGY>                         -> Selects how classical registers are set from literals: 'width' sets one
+                                                    bit at a time with a single extra qubit (default), and 'depth' sets
+                                                    them all at once with an extra register with a qubit for each one
+                                                    bit of a literal, if the region has enough qubits to spare
+--debug                                        -> Prints statistics about the compilation to STDERR, such as how many
+                                                    constant operations were folded
+--arena                                        -> Like --direct-ast, but stores the abstract syntax tree in compact
+                                                    arrays instead of one object per node, to save memory on large inputs
                 """
 
     def __init__(self, args=None):
@@ -44,6 +87,16 @@ Options:
         self.region_file_map = {}
         self.regions_to_stdout = []
         self.save_all_by_default = True
+        self.parser_mode = DEFAULT_PARSER_MODE
+        self.direct_ast = False
+        self.arena = False
+        self.fused_analysis = False
+        self.debug = False
+        self.jobs = 1
+        self.inline_level = 0
+        self.optimization_level = 0
+        self.reuse_qubits = False
+        self.creg_initialization = DEFAULT_CLASSICAL_INITIALIZATION
         if args is None:
             self.args = []
         else:
@@ -93,6 +146,17 @@ Options:
                 return True
             elif arg == "--no-default-save":
                 self.save_all_by_default = False
+            elif arg == "--no-parser-cache":
+                input_parser.PARSER_CACHE_DIR = None
+            elif arg == "--direct-ast":
+                self.direct_ast = True
+            elif arg == "--debug":
+                self.debug = True
+            elif arg == "--fused-analysis":
+                self.fused_analysis = True
+            elif arg == "--arena":
+                self.direct_ast = True
+                self.arena = True
             elif arg == "-l" or arg == "--location":
                 skip_next = 1
                 if get_next_or_err(i, self.args, expected="PATH")[0]:
@@ -118,15 +182,93 @@ Options:
                     self.regions_to_stdout.append(r)
                 else:
                     return True
+            elif arg == "-p" or arg == "--parser":
+                skip_next = 1
+                if get_next_or_err(i, self.args, expected="MODE")[0]:
+                    m = get_next_or_err(i, self.args)[1]
+                    if m not in PARSER_MODES:
+                        self.interface_error(
+                            "Unknown parser mode '"
+                            + m
+                            + "': expected one of "
+                            + ", ".join(PARSER_MODES)
+                        )
+                        return True
+                    self.parser_mode = m
+                else:
+                    return True
+            elif arg in ["-O" + str(level) for level in OPTIMIZATION_LEVELS]:
+                self.optimization_level = int(arg[2:])
+            elif arg == "--reuse-qubits":
+                self.reuse_qubits = True
+            elif arg == "--creg-init":
+                skip_next = 1
+                if get_next_or_err(i, self.args, expected="STRATEGY")[0]:
+                    strategy = get_next_or_err(i, self.args)[1]
+                    if strategy not in CLASSICAL_INITIALIZATIONS:
+                        self.interface_error(
+                            "Unknown initialization strategy '"
+                            + strategy
+                            + "': expected one of "
+                            + ", ".join(CLASSICAL_INITIALIZATIONS)
+                        )
+                        return True
+                    self.creg_initialization = strategy
+                else:
+                    return True
+            elif arg == "--inline":
+                skip_next = 1
+                if get_next_or_err(i, self.args, expected="LEVEL")[0]:
+                    n = get_next_or_err(i, self.args)[1]
+                    if n not in [str(level) for level in INLINE_GROWTH]:
+                        self.interface_error(
+                            "Invalid inlining level '"
+                            + n
+                            + "': expected one of "
+                            + ", ".join(str(level) for level in INLINE_GROWTH)
+                        )
+                        return True
+                    self.inline_level = int(n)
+                else:
+                    return True
+            elif arg == "-j" or arg == "--jobs":
+                skip_next = 1
+                if get_next_or_err(i, self.args, expected="N")[0]:
+                    n = get_next_or_err(i, self.args)[1]
+                    if not n.isdigit() or int(n) < 1:
+                        self.interface_error(
+                            "Invalid number of jobs '" + n + "': expected a positive integer"
+                        )
+                        return True
+                    self.jobs = int(n)
+                else:
+                    return True
             else:
                 self.interface_error("Unexpected argument '" + arg + "'")
                 return True
+        if self.direct_ast and self.parser_mode == "earley":
+            self.interface_error(
+                ("--arena" if self.arena else "--direct-ast")
+                + " cannot be used with the Earley parser"
+            )
+            return True
         return False
 
     def step_one(self):
-        symbol_tree = parse_file(self.file_to_open)
+        if self.file_to_open == "-":
+            symbol_tree = parse_stream(stdin, mode=self.parser_mode)
+        else:
+            symbol_tree = parse_file(self.file_to_open, mode=self.parser_mode)
         return symbol_tree
 
+    def step_one_and_two(self):
+        if self.file_to_open == "-":
+            ast = build_ast_from_stream(stdin, arena=self.arena)
+        else:
+            ast = build_ast_from_file(self.file_to_open, arena=self.arena)
+        ast.go_to_top()
+        return ast
+
     def step_two(self, symbol_tree):
         builder = ASTBuilder(symbol_tree)
         builder.traverse()
@@ -145,18 +287,69 @@ Options:
     def step_five(self, ast):
         comp = ComputationHandler(ast)
         comp.traverse()
+        self.print_debug(comp.folder.report())
+
+    def print_debug(self, report):
+        if self.debug and report:
+            print(report, file=stderr)
+
+    def step_three_to_five(self, ast):
+        analyzer = SemanticAnalyzer(ast)
+        analyzer.traverse()
+        self.print_debug(analyzer.folder.report())
+        return analyzer.state
+
+    def step_five_and_a_half(self, ast, state):
+        pruner = BranchPruner(ast, state)
+        pruner.traverse()
+        self.print_debug(pruner.report())
 
     def step_six(self, state):
-        transpiler = Transpiler(state)
+        transpiler = Transpiler(state, self.creg_initialization)
         transpiler.transpile()
         return transpiler.programs, transpiler.gates
 
-    def step_seven(self, programs, gates):
-        files = Output.generate_output(programs, gates)
-        for name, code in files:
+    def step_six_and_a_half(self, programs, gates):
+        if self.inline_level > 0:
+            inliner = Inliner(gates, self.inline_level)
+            inliner.inline_gates()
+            for program in programs.values():
+                inliner.inline_program(program)
+            self.print_debug(inliner.report())
+        if self.optimization_level > 0:
+            optimizer = PeepholeOptimizer(self.optimization_level)
+            optimizer.optimize_gates(gates)
+            for program in programs.values():
+                optimizer.optimize_program(program)
+            self.print_debug(optimizer.report())
+        if self.reuse_qubits:
+            allocator = QubitAllocator()
+            for name, program in programs.items():
+                allocator.allocate_program(name, program)
+            self.print_debug(allocator.report())
+
+    def step_four_to_six_in_parallel(self, ast, state):
+        programs, gates, reports = compile_regions(
+            ast,
+            state,
+            jobs=self.jobs,
+            analysed=self.fused_analysis,
+            inline_level=self.inline_level,
+            optimization_level=self.optimization_level,
+            reuse_qubits=self.reuse_qubits,
+            creg_initialization=self.creg_initialization,
+        )
+        for report in reports:
+            self.print_debug(report)
+        return Output.stream_output(programs, gates)
+
+    def step_seven(self, files):
+        # Each file is the name of a region, and a function that writes its code into a file-like sink
+        for name, write in files:
             # Print the region if it was specified in --stdout
             if name in self.regions_to_stdout:
-                print(code)
+                write(stdout)
+                stdout.write("\n")
             # If the user defined a custom name for the region output, use that
             if name in self.region_file_map.keys():
                 file_name = self.region_file_map[name]
@@ -167,46 +360,77 @@ Options:
             # Create build folder path if it does not already exist
             Path(self.output_folder).mkdir(parents=True, exist_ok=True)
             # Write the code
-            write_out = open(self.output_folder + "/" + file_name + ".qasm", mode="w")
-            write_out.write(code)
+            with open(
+                self.output_folder + "/" + file_name + ".qasm", mode="w"
+            ) as write_out:
+                write(write_out)
 
     def main(self):
         # Main function for the compiler
         try:
-            # Step One: Parse the input file
-            symbol_tree = self.step_one()
+            if self.direct_ast:
+                # Steps One and Two: Parse the input file directly into an abstract syntax tree
+                ast = self.step_one_and_two()
+            else:
+                # Step One: Parse the input file
+                symbol_tree = self.step_one()
 
-            # Step Two: Build the symbol tree into an abstract syntax tree
-            ast = self.step_two(symbol_tree)
+                # Step Two: Build the symbol tree into an abstract syntax tree
+                ast = self.step_two(symbol_tree)
 
-            # Step Three: Perform internal resolution of expression types and check
-            # that all identifiers are valid
-            self.step_three(ast)
+            if self.fused_analysis:
+                # Steps Three to Five: Resolve identifiers, check for errors and resolve constant
+                # expressions in a single walk, which also initializes the program state
+                s = self.step_three_to_five(ast)
+            else:
+                # Step Three: Perform internal resolution of expression types and check
+                # that all identifiers are valid
+                self.step_three(ast)
 
-            # Initialize the program state, which will index the AST
-            s = State(ast)
+                # Initialize the program state, which will index the AST
+                s = State(ast)
 
-            # Step Four: Check for errors
-            self.step_four(ast, s)
+            if self.jobs > 1:
+                # Steps Four to Six, for each region in a separate process. Regions are checked and
+                # their constant expressions resolved there too, unless the analysis was fused.
+                files = self.step_four_to_six_in_parallel(ast, s)
+            else:
+                if not self.fused_analysis:
+                    # Step Four: Check for errors
+                    self.step_four(ast, s)
 
-            # Step Five: Resolve constant expressions
-            self.step_five(ast)
+                    # Step Five: Resolve constant expressions
+                    self.step_five(ast)
 
-            # ast.context.debug_print()
+                # Remove the branches of if statements whose conditions are known at compile time
+                self.step_five_and_a_half(ast, s)
 
-            # Step Six: Transpile the AST into OpenQASM
-            programs, gates = self.step_six(s)
+                # ast.context.debug_print()
+
+                # Step Six: Transpile the AST into OpenQASM
+                programs, gates = self.step_six(s)
+
+                # Inline calls to functions where the cost model finds it worthwhile, simplify the
+                # instructions, and reuse qubits, if asked to
+                self.step_six_and_a_half(programs, gates)
+                files = Output.stream_output(programs, gates)
 
             # Step Seven: Output the generated code
-            self.step_seven(programs, gates)
+            self.step_seven(files)
 
         except CompilerError as e:
             print(e)
             exit(1)
-        except UnexpectedCharacters as u:
+        except UnexpectedInput as u:
+            # Unexpected characters report the allowed terminals, while unexpected tokens
+            # and an unexpected end of input report the expected terminals
+            if isinstance(u, UnexpectedCharacters):
+                allowed = u.allowed
+            else:
+                allowed = u.expected
             # Filter out tokens such as __ANON_1, etc.
-            c_set = set(c for c in u.allowed if c[0:2] != "__")
-            c = CompilerError("S0", ceil(u.line / 2), u.column, info=str(c_set))
+            c_set = set(c for c in allowed if c[0:2] != "__")
+            c = CompilerError("S0", u.line, u.column, info=str(c_set))
             print(c)
             exit(1)
         exit(0)
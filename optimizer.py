@@ -0,0 +1,198 @@
+from qasm import (
+    BIG_UINT,
+    CREG,
+    C_REG,
+    GATE,
+    MEASURE,
+    MEASURE_REGISTER,
+    QREG,
+    Q_INDEX,
+    Q_SLICE,
+    RESET,
+    RESET_QUBIT,
+    UINT,
+    InstructionList,
+    gate_arguments,
+    gate_operands,
+    uint_argument,
+)
+from scope import MEASUREMENT_QUBIT_NAME
+from standard_library import StandardLibrary
+
+# The levels of -O. Level 0 leaves the instructions as they are.
+OPTIMIZATION_LEVELS = [0, 1, 2]
+
+SELF_INVERSE = "self_inverse"
+ROTATION = "rotation"
+
+
+class PeepholeOptimizer:
+    """
+    The PeepholeOptimizer simplifies transpiled instructions with three passes, done together in one
+    walk of the instructions: it removes rotations by an angle of zero, cancels pairs of the same
+    self-inverse gate on the same qubits, and merges consecutive rotations about the same axis on the
+    same qubits. At level 1, a gate is only combined with the instruction kept right before it. Since
+    a cancelled pair is no longer kept, the gates around it then follow each other, so nested pairs
+    such as h, x, x, h cancel completely. At level 2, a gate is combined with the last kept
+    instruction on its qubits, so instructions on other qubits in between do not prevent it.
+    Gates are only combined if they run under the same condition, and if no instruction in between
+    wrote to a classical register the condition reads. Measurements, resets and user gates are never
+    changed, and act as barriers on their qubits.
+    """
+
+    def __init__(self, level: int = 1):
+        self.level = level
+        # The number of changes made by each pass
+        self.removed = 0
+        self.cancelled = 0
+        self.merged = 0
+        # The kind of each gate name, if it is a self-inverse gate or a rotation
+        self.kinds = {}
+
+    def optimize_gates(self, gates: dict):
+        for gate in gates.values():
+            gate.instructions = self.optimize(gate.instructions)
+
+    def optimize_program(self, program):
+        program.instructions = self.optimize(program.instructions)
+
+    def optimize(self, instructions):
+        if self.level == 0:
+            return instructions
+        # The [opcode, operands, condition] lists of the instructions kept so far. Instructions
+        # that are removed later are replaced by None.
+        self.kept = []
+        # The indexes of the kept instructions on each qubit, in order
+        self.touched = {}
+        # The index of the last instruction that wrote to each classical register
+        self.written = {}
+        sizes = {MEASUREMENT_QUBIT_NAME: 1}
+        for opcode, operands, condition in instructions:
+            if opcode == QREG:
+                sizes[operands[0]] = operands[1]
+            qubits = self.qubits(opcode, operands, sizes)
+            if opcode == GATE and self.combine(operands, condition, qubits):
+                continue
+            index = len(self.kept)
+            self.kept.append([opcode, operands, condition])
+            for q in qubits:
+                self.touched.setdefault(q, []).append(index)
+            if opcode == CREG:
+                self.written[operands[0]] = index
+            elif opcode == MEASURE:
+                self.written[operands[3]] = index
+            elif opcode == MEASURE_REGISTER:
+                self.written[operands[1]] = index
+        optimized = InstructionList()
+        optimized.extend(i for i in self.kept if i is not None)
+        self.kept = self.touched = self.written = None
+        return optimized
+
+    # Returns the qubits an instruction acts on, as (register, index) pairs. The parameters of a
+    # function are single qubits, and have no index.
+    @staticmethod
+    def qubits(opcode, operands, sizes) -> list:
+        if opcode == GATE:
+            qubits = []
+            for q in gate_arguments(operands)[2]:
+                if q[0] == Q_INDEX:
+                    qubits.append((q[1], q[2]))
+                elif q[0] == Q_SLICE:
+                    qubits += [(q[1], i) for i in range(q[2], max(q[2], q[3]) + 1)]
+                elif q[1] in sizes:
+                    qubits += [(q[1], i) for i in range(sizes[q[1]])]
+                else:
+                    qubits.append((q[1], None))
+            return qubits
+        elif opcode == MEASURE:
+            return [(operands[0], i) for i in range(operands[1], operands[2] + 1)]
+        elif opcode == RESET_QUBIT:
+            return [(operands[0], operands[1])]
+        elif opcode in (QREG, RESET, MEASURE_REGISTER):
+            return [(operands[0], i) for i in range(sizes.get(operands[0], 1))]
+        return []
+
+    def kind(self, name):
+        if name not in self.kinds:
+            if StandardLibrary.is_self_inverse_gate(name):
+                self.kinds[name] = SELF_INVERSE
+            elif StandardLibrary.is_rotation_gate(name):
+                self.kinds[name] = ROTATION
+            else:
+                self.kinds[name] = None
+        return self.kinds[name]
+
+    # Returns the angle of a rotation, or None if it is not known at compile time
+    @staticmethod
+    def angle(carg):
+        if carg[0] == UINT:
+            return carg[1]
+        elif carg[0] == BIG_UINT:
+            return int(carg[1])
+        return None
+
+    # Combine a gate with the last instruction on its qubits, if possible, and return whether it was
+    def combine(self, operands, condition, qubits) -> bool:
+        name, cargs, qargs = gate_arguments(operands)
+        kind = self.kind(name)
+        if kind is None or not qubits:
+            return False
+        if kind == ROTATION and self.angle(cargs[0]) == 0:
+            self.removed += 1
+            return True
+        # A gate with several arguments that is repeated over a slice or a register is not the
+        # same as its inverse repeated in the same order
+        if len(qargs) > 1 and len(qubits) != len(qargs):
+            return False
+        if len(set(qubits)) != len(qubits):
+            return False
+        stacks = [self.touched.get(q) for q in qubits]
+        if not stacks[0]:
+            return False
+        p = stacks[0][-1]
+        if any(not s or s[-1] != p for s in stacks):
+            return False
+        if self.level < 2 and p != len(self.kept) - 1:
+            return False
+        opcode, previous, previous_condition = self.kept[p]
+        if opcode != GATE or previous_condition != condition:
+            return False
+        for _, arg1, arg2 in condition:
+            for arg_kind, value in (arg1, arg2):
+                if arg_kind == C_REG and self.written.get(value, -1) > p:
+                    return False
+        previous_name, previous_cargs, previous_qargs = gate_arguments(previous)
+        if previous_name != name or previous_qargs != qargs:
+            return False
+        if kind == SELF_INVERSE:
+            self.remove(p, stacks)
+            self.cancelled += 1
+            return True
+        first = self.angle(previous_cargs[0])
+        second = self.angle(cargs[0])
+        if first is None or second is None:
+            return False
+        self.merged += 1
+        if first + second == 0:
+            self.remove(p, stacks)
+        else:
+            self.kept[p][1] = gate_operands(
+                name, [uint_argument(first + second)], qargs
+            )
+        return True
+
+    def remove(self, index, stacks):
+        self.kept[index] = None
+        for s in stacks:
+            s.pop()
+        # Removed instructions at the end are dropped, so that the last kept instruction is last
+        while self.kept and self.kept[-1] is None:
+            self.kept.pop()
+
+    def report(self) -> str:
+        if self.removed == 0 and self.cancelled == 0 and self.merged == 0:
+            return ""
+        return (
+            "Peephole optimization: %d self-inverse pairs cancelled, %d rotations merged, "
+            "%d identity rotations removed" % (self.cancelled, self.merged, self.removed)
+        )
@@ -1,28 +1,50 @@
+from io import StringIO
+
+
 class Output:
     program_header = """// Generated by the Funq compiler
 OPENQASM 2.0;
 include "qelib1.inc";
 """
 
+    # Write the complete code of a region into a file-like sink, such as an open file, stdout, or a StringIO
+    @staticmethod
+    def write_program(name: str, program, gates: dict, sink):
+        sink.write(
+            "// Program: "
+            + name
+            + ", "
+            + str(program.qubits)
+            + " qubits\n"
+            + Output.program_header
+        )
+        for n, gate in gates.items():
+            if n in program.dependencies:
+                gate.write(sink)
+                sink.write("\n")
+        program.write(sink)
+
+    @staticmethod
+    def stream_output(programs: dict, gates: dict):
+        """
+        Returns a (name, write) pair for each region, where write(sink) writes the code of the region into a
+        file-like sink. The code is only generated when it is written, so it is never held in memory as a whole.
+        """
+        files = []
+        for name, program in programs.items():
+
+            def write(sink, name=name, program=program):
+                Output.write_program(name, program, gates, sink)
+
+            files.append((name, write))
+        return files
+
+    # Like stream_output, but returns the code of each region as a string
     @staticmethod
     def generate_output(programs: dict, gates: dict):
         files = []
-        for name in programs.keys():
-            program = programs[name]
-            comment_header = (
-                "// Program: "
-                + name
-                + ", "
-                + str(program.qubits)
-                + " qubits\n"
-                + Output.program_header
-            )
-            gates_required = {
-                k: v for k, v in gates.items() if k in program.dependencies
-            }
-            for n in gates_required.keys():
-                gate = gates_required[n]
-                comment_header += gate.emit() + "\n"
-            program = comment_header + program.emit()
-            files.append((name, program))
+        for name, write in Output.stream_output(programs, gates):
+            code = StringIO()
+            write(code)
+            files.append((name, code.getvalue()))
         return files
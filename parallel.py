@@ -0,0 +1,174 @@
+import multiprocessing
+from checker import ErrorChecker
+from computation import ComputationHandler
+from allocator import QubitAllocator
+from errors import CompilerError
+from inliner import Inliner
+from optimizer import PeepholeOptimizer
+from pruner import BranchPruner
+from transpiler import DEFAULT_CLASSICAL_INITIALIZATION, Transpiler
+
+# The program being compiled by the worker processes: the AST, the state, the generated gates,
+# whether the AST has already been checked and folded, the levels of function inlining and of
+# optimization, whether qubits are reused, and how classical registers are initialized. Workers
+# are forked from the compiler process, so they inherit it instead of it being sent to each of them.
+WORK = None
+
+# The passes run on each region and function, in the order the sequential compiler runs them over
+# the whole program. Errors are ranked by pass first, so the error that is raised is the one the
+# sequential compiler would raise.
+CHECK, FOLD, PRUNE = range(3)
+
+
+def check_and_fold(ast, state, scope, analysed: bool) -> (list, tuple):
+    """
+    Runs the ErrorChecker and the ComputationHandler (unless the AST was already analysed) and the
+    BranchPruner on a single region or function, and returns their debug reports, and the rank and
+    the error of the first error they raised, or None.
+    """
+    reports = []
+    step = CHECK
+    try:
+        if not analysed:
+            checker = ErrorChecker(ast, state)
+            checker.set_source(scope)
+            checker.traverse()
+            step = FOLD
+            comp = ComputationHandler(ast)
+            comp.set_source(scope)
+            comp.traverse()
+            reports.append(comp.folder.report())
+        step = PRUNE
+        pruner = BranchPruner(ast, state, scope=scope)
+        pruner.traverse()
+        reports.append(pruner.report())
+    except CompilerError as e:
+        return reports, ((step, scope.line, scope.column), e)
+    return reports, None
+
+
+def compile_region(name):
+    """
+    Compiles a single region, returning its name, its program, its debug reports, and the rank and
+    the error of its first error, if it has one, in which case the region is not transpiled
+    """
+    (
+        ast,
+        state,
+        gates,
+        analysed,
+        inline_level,
+        optimization_level,
+        reuse_qubits,
+        creg_initialization,
+    ) = WORK
+    reports, error = check_and_fold(ast, state, ast.regions[name][0], analysed)
+    if error is not None:
+        return name, None, reports, error
+    transpiler = Transpiler(state, creg_initialization)
+    transpiler.transpile_region(name)
+    if inline_level > 0:
+        # The gates were already inlined into each other before the workers were forked
+        inliner = Inliner(gates, inline_level)
+        inliner.inline_program(transpiler.programs[name])
+        reports.append(inliner.report())
+    if optimization_level > 0:
+        optimizer = PeepholeOptimizer(optimization_level)
+        optimizer.optimize_program(transpiler.programs[name])
+        reports.append(optimizer.report())
+    if reuse_qubits:
+        allocator = QubitAllocator()
+        allocator.allocate_program(name, transpiler.programs[name])
+        reports.append(allocator.report())
+    # The program is sent back as it is, so its instructions are only turned into code while the
+    # output is written
+    return name, transpiler.programs[name], reports, None
+
+
+def compile_regions(
+    ast,
+    state,
+    jobs: int = 1,
+    analysed: bool = False,
+    inline_level: int = 0,
+    optimization_level: int = 0,
+    reuse_qubits: bool = False,
+    creg_initialization: str = DEFAULT_CLASSICAL_INITIALIZATION,
+):
+    """
+    Compiles every region of a resolved AST, with up to jobs worker processes, and returns the
+    program of each region by name, in the order the regions are declared, the gates, and the debug
+    reports of the passes. Functions are checked and turned into gates first, since every region
+    shares them. Each region is pruned by its worker, and if analysed is False, it is also checked and
+    folded there; otherwise the whole AST must already have been analysed. If inline_level is above 0,
+    functions are inlined into each other first, and into each region by its worker. Likewise, if
+    optimization_level is above 0, the gates are optimized first, and each region by its worker.
+    If reuse_qubits is True, each worker also maps the qubits of its region onto as few as it can.
+    Classical registers are initialized with the creg_initialization strategy.
+    Workers need to be forked from this process, so where that is not possible, the regions are
+    compiled one after the other, and a debug report says so.
+    If any region or function has an error, the error raised is the one compiling the regions one
+    after the other would raise: the first error the ErrorChecker finds in the file, or if there is
+    none, the first error of the ComputationHandler, and so on.
+    """
+    global WORK
+    reports = []
+    errors = []
+    for function in ast.functions.values():
+        function_reports, error = check_and_fold(ast, state, function, analysed)
+        reports += function_reports
+        if error is not None:
+            errors.append(error)
+    if errors:
+        # The regions still have to be checked, since an error in a region may come first. Gates
+        # cannot be made from functions with errors, so this is done here, one region at a time.
+        for name in state.regions.keys():
+            error = check_and_fold(ast, state, ast.regions[name][0], analysed)[1]
+            if error is not None:
+                errors.append(error)
+        raise min(errors, key=lambda e: e[0])[1]
+    transpiler = Transpiler(state)
+    transpiler.transpile_functions()
+    if inline_level > 0:
+        inliner = Inliner(transpiler.gates, inline_level)
+        inliner.inline_gates()
+        reports.append(inliner.report())
+    if optimization_level > 0:
+        optimizer = PeepholeOptimizer(optimization_level)
+        optimizer.optimize_gates(transpiler.gates)
+        reports.append(optimizer.report())
+    WORK = (
+        ast,
+        state,
+        transpiler.gates,
+        analysed,
+        inline_level,
+        optimization_level,
+        reuse_qubits,
+        creg_initialization,
+    )
+    names = list(state.regions.keys())
+    try:
+        if jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            chunk_size = max(1, len(names) // (jobs * 4))
+            with multiprocessing.get_context("fork").Pool(jobs) as pool:
+                # imap returns the results in the order the regions are declared
+                results = list(pool.imap(compile_region, names, chunk_size))
+        else:
+            if jobs > 1:
+                reports.append(
+                    "Parallel compilation: processes cannot be forked on this platform, so "
+                    "the regions were compiled one after the other"
+                )
+            results = [compile_region(name) for name in names]
+    finally:
+        WORK = None
+    programs = {}
+    for name, program, region_reports, error in results:
+        programs[name] = program
+        reports += region_reports
+        if error is not None:
+            errors.append(error)
+    if errors:
+        raise min(errors, key=lambda e: e[0])[1]
+    return programs, transpiler.gates, [r for r in reports if r]
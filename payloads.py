@@ -8,31 +8,53 @@ class Payload:
     store data if it is representing a token or fundamental atomic
     of the language. Most payloads contain getter functions, which
     simplify the process of retrieving data from child nodes.
+    Payloads use __slots__ to keep the size of each node down, so every
+    subclass that stores data must list its attributes in __slots__.
     """
 
+    __slots__ = ("type", "owning_scope", "roles")
+
     def __init__(self, p_type):
         self.type = p_type
         self.owning_scope = None
+        self.roles = None
 
     def set_scope(self, scope):
         self.owning_scope = scope
 
+    # Return the first child node of the owning scope with the given type, or None.
+    # The children are indexed by type the first time this is called, so later lookups
+    # are constant time. The index must be reset whenever the children are replaced.
+    def find_role(self, data):
+        if self.roles is None:
+            roles = {}
+            for c in self.owning_scope.children:
+                if c.data not in roles:
+                    roles[c.data] = c
+            self.roles = roles
+        return self.roles.get(data)
+
+    def reset_roles(self):
+        self.roles = None
+
 
 class FunctionPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("function")
 
     def get_name(self):
-        for n in self.owning_scope.children:
-            if n.data == "f_ident":
-                return n
-        raise Exception("No name for function!")
+        n = self.find_role("f_ident")
+        if n is None:
+            raise Exception("No name for function!")
+        return n
 
     def get_block(self):
-        for b in self.owning_scope.children:
-            if b.data == "block":
-                return b
-        raise Exception("No block in function!")
+        b = self.find_role("block")
+        if b is None:
+            raise Exception("No block in function!")
+        return b
 
     def get_classical_arguments(self) -> list:
         arguments = self.owning_scope.get_arg_list().get_arguments()
@@ -51,9 +73,9 @@ class FunctionPayload(Payload):
         return quantum_args
 
     def get_arg_list(self):
-        for a in self.owning_scope.children:
-            if a.data == "arg_list":
-                return a
+        a = self.find_role("arg_list")
+        if a is not None:
+            return a
         # We return this if there is no argument list in the function
         a = ArgListPayload()
         a.set_scope(self.owning_scope)
@@ -65,33 +87,41 @@ class FunctionPayload(Payload):
 
 
 class FunctionCallPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("function_call")
 
     def get_name(self):
-        for n in self.owning_scope.children:
-            if n.data == "f_ident":
-                return n
-        raise Exception("No name for function call!")
+        n = self.find_role("f_ident")
+        if n is None:
+            raise Exception("No name for function call!")
+        return n
 
     def get_call_list(self):
-        for c in self.owning_scope.children:
-            if c.data == "call_list":
-                return c
-        raise Exception("No call list for function call!")
+        c = self.find_role("call_list")
+        if c is None:
+            raise Exception("No call list for function call!")
+        return c
 
 
 class AssignmentPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("assignment")
 
 
 class BlockPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("block")
 
 
 class OpPayload(Payload):
+    __slots__ = ("operation",)
+
     def __init__(self, op):
         super().__init__("operation")
         self.operation = op
@@ -112,6 +142,8 @@ class OpPayload(Payload):
 
 
 class BoolOpPayload(Payload):
+    __slots__ = ("operation",)
+
     def __init__(self, op):
         super().__init__("b_expr")
         self.operation = op
@@ -129,6 +161,8 @@ class BoolOpPayload(Payload):
 
 
 class IfPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("if")
 
@@ -144,37 +178,56 @@ class IfPayload(Payload):
 
 
 class FIdentPayload(Payload):
+    __slots__ = ("name",)
+
     def __init__(self, name):
         super().__init__("f_ident")
         self.name = name
 
 
 class VIdentPayload(Payload):
+    __slots__ = ("name", "v_type", "symbol")
+
     def __init__(self, name, type=""):
         super().__init__("v_ident")
         self.name = name
         self.v_type = type
+        self.symbol = None
 
     def resolve_type(self, type):
         self.v_type = type
 
+    # Link this identifier to the symbol of the variable it refers to
+    def resolve_symbol(self, symbol):
+        self.symbol = symbol
+        self.v_type = symbol.v_type.name
+
+    def get_symbol(self):
+        return self.symbol
+
     def get_type_name(self):
         return self.v_type
 
 
 class RIdentPayload(Payload):
+    __slots__ = ("name",)
+
     def __init__(self, name):
         super().__init__("r_ident")
         self.name = name
 
 
 class TypePayload(Payload):
+    __slots__ = ("name",)
+
     def __init__(self, name):
         super().__init__("type")
         self.name = name
 
 
 class UIntPayload(Payload):
+    __slots__ = ("value",)
+
     def __init__(self, val):
         super().__init__("uint")
         self.value = val
@@ -184,6 +237,8 @@ class UIntPayload(Payload):
 
 
 class CallListPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("call_list")
 
@@ -208,6 +263,8 @@ class CallListPayload(Payload):
 
 
 class ArgListPayload(Payload):
+    __slots__ = ("is_empty",)
+
     def __init__(self):
         super().__init__("arg_list")
         self.is_empty = False
@@ -223,6 +280,8 @@ class ArgListPayload(Payload):
 
 
 class ArgPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("arg")
 
@@ -234,29 +293,33 @@ class ArgPayload(Payload):
 
 
 class RegionPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("region")
 
     def get_name(self):
-        for n in self.owning_scope.children:
-            if n.type == "r_ident":
-                return n
-        raise Exception("No name for region!")
+        n = self.find_role("r_ident")
+        if n is None:
+            raise Exception("No name for region!")
+        return n
 
     def get_qubit_cap(self):
-        for c in self.owning_scope.children:
-            if c.type == "uint":
-                return c.value
-        raise Exception("No qubit count for region!")
+        c = self.find_role("uint")
+        if c is None:
+            raise Exception("No qubit count for region!")
+        return c.value
 
     def get_block(self):
-        for b in self.owning_scope.children:
-            if b.type == "block":
-                return b
-        raise Exception("No block for region!")
+        b = self.find_role("block")
+        if b is None:
+            raise Exception("No block for region!")
+        return b
 
 
 class QuantumSlicePayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("q_slice")
 
@@ -271,6 +334,8 @@ class QuantumSlicePayload(Payload):
 
 
 class QuantumLiteralPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("q_lit")
 
@@ -285,6 +350,8 @@ class QuantumLiteralPayload(Payload):
 
 
 class ClassicalDeclarationPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("c_decl")
 
@@ -305,6 +372,8 @@ class ClassicalDeclarationPayload(Payload):
 
 
 class ClassicalLiteralPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("c_lit")
 
@@ -319,6 +388,8 @@ class ClassicalLiteralPayload(Payload):
 
 
 class QuantumDeclarationPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("q_decl")
 
@@ -339,12 +410,16 @@ class QuantumDeclarationPayload(Payload):
 
 
 class BitPayload(Payload):
+    __slots__ = ("value",)
+
     def __init__(self, value: bool):
         super().__init__("bit")
         self.value = value
 
 
 class QuantumIndexPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("q_index")
 
@@ -359,6 +434,8 @@ class QuantumIndexPayload(Payload):
 
 
 class MeasurementPayload(Payload):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("measurement")
 
@@ -370,3 +447,35 @@ class MeasurementPayload(Payload):
 
     def get_q_expr(self):
         return self.owning_scope.children[2]
+
+
+# The names of the data attributes of each payload class, including inherited ones
+_payload_fields = {}
+
+
+def payload_fields(payload) -> frozenset:
+    cls = type(payload)
+    if cls not in _payload_fields:
+        names = set()
+        for c in cls.__mro__:
+            names.update(getattr(c, "__slots__", ()))
+        _payload_fields[cls] = frozenset(names)
+    return _payload_fields[cls]
+
+
+def payload_accessors() -> (dict, set):
+    """
+    Returns the getter functions of every payload class, by name and then by class, and the names of the data
+    attributes of every payload class
+    """
+    getters = {}
+    fields = set()
+    classes = [Payload]
+    while len(classes) > 0:
+        cls = classes.pop()
+        classes += cls.__subclasses__()
+        for name in dir(cls):
+            if name[0:4] == "get_":
+                getters.setdefault(name, {})[cls] = getattr(cls, name)
+        fields.update(getattr(cls, "__slots__", ()))
+    return getters, fields
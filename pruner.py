@@ -0,0 +1,64 @@
+from visitor import Transformer
+from computation import COMPARISONS
+from state import State
+
+
+class BranchPruner(Transformer):
+    """
+    The BranchPruner removes if statements whose conditions are known at compile time, once the ComputationHandler
+    has replaced constant expressions with numbers. The statements of an if statement whose condition is always true
+    are moved into the enclosing block, and an if statement whose condition is always false is removed along with
+    its statements. The dependencies of each region are found again afterwards, so functions that are only called
+    from removed branches are not emitted.
+    If a scope is given, only that region or function is pruned.
+    """
+
+    def __init__(self, ast, state: State, scope=None):
+        ast.go_to_top()
+        super().__init__(ast.context if scope is None else scope)
+        self.state = state
+        # The number of if statements that were removed, and the number that were replaced by their statements
+        self.removed = 0
+        self.spliced = 0
+
+    def traverse(self):
+        super().traverse()
+        if self.tree.data == "region":
+            self.state.update_dependencies([self.tree.get_name().name])
+        elif self.tree.data != "function":
+            self.state.update_dependencies()
+
+    # Returns the result of the condition of an if statement, or None if it is not known at compile time
+    def compile_time_result(self, stmt):
+        arg1, arg2 = stmt.get_args()
+        if arg1.data != "uint" or arg2.data != "uint":
+            return None
+        return COMPARISONS[stmt.get_op().get_operation()](arg1.value, arg2.value)
+
+    # Blocks are pruned after their children, so the branches of nested if statements are already pruned
+    def after_transform_block(self, scope):
+        statements = []
+        pruned = False
+        for stmt in scope.children:
+            if stmt.data == "if":
+                result = self.compile_time_result(stmt)
+                if result is not None:
+                    pruned = True
+                    if result:
+                        statements += stmt.get_block().children
+                        self.spliced += 1
+                    else:
+                        self.removed += 1
+                    continue
+            statements.append(stmt)
+        if pruned:
+            scope.replace_children(statements)
+        return scope
+
+    def report(self) -> str:
+        if self.removed == 0 and self.spliced == 0:
+            return ""
+        return (
+            "Branch pruning: %d if statements removed, %d replaced by their statements"
+            % (self.removed, self.spliced)
+        )
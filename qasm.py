@@ -1,238 +1,364 @@
-from scope import MEASUREMENT_QUBIT_NAME
-
-
-class InstructionArgument:
-    def __init__(self, arg_type):
-        self.arg_type = arg_type
-
-    def emit(self) -> str:
-        raise Exception("A subclass of InstructionArgument did not override emit")
-
-
-class UIntArgument(InstructionArgument):
-    def __init__(self, value):
-        super().__init__("uint")
-        self.value = value
-
-    def emit(self) -> str:
-        return str(self.value)
-
-
-class CRegArgument(InstructionArgument):
-    def __init__(self, name):
-        super().__init__("c_reg")
-        self.name = name
-
-    def emit(self) -> str:
-        return self.name
-
-
-class QuantumIndexArgument(InstructionArgument):
-    def __init__(self, name, index):
-        super().__init__("q_index")
-        self.name = name
-        self.index = index
-
-    def emit(self) -> str:
-        return self.name + "[" + str(self.index) + "]"
-
-
-class QuantumRegArgument(InstructionArgument):
-    def __init__(self, name):
-        super().__init__("q_reg")
-        self.name = name
-
-    def emit(self) -> str:
-        return self.name
-
-
-class QuantumSliceArgument(InstructionArgument):
-    def __init__(self, name, start, end):
-        super().__init__("q_slice")
-        self.name = name
-        self.start = start
-        self.end = end
-        self.iter = self.start
-
-    def emit(self) -> str:
-        return self.name + "[" + str(self.iter) + "]"
-
-    def reset(self):
-        self.iter = self.start
-
-    def increment(self) -> bool:
-        if self.iter < self.end:
-            self.iter += 1
-            return True
-        else:
-            return False
-
-
-class Instruction:
-    def __init__(self, instruction_type):
-        self.instruction_type = instruction_type
-
-    def emit(self) -> str:
-        return "// Empty instruction. You should not be seeing this."
-
-
-class FunctionCall(Instruction):
-    def __init__(self, name, cargs, qargs):
-        super().__init__("func_call")
-        self.name = name
-        self.cargs = cargs
-        self.qargs = qargs
-
-    def emit(self) -> str:
-        output = ""
-        func = self.name
-        if len(self.cargs) == 0:
-            header = func + " "
-        else:
-            header = func + "(" + ",".join([c.emit() for c in self.cargs]) + ") "
-        should_repeat = False
-        var_to_repeat = None
-        for q in self.qargs:
-            if q.arg_type == "q_slice":
-                should_repeat = True
-                var_to_repeat = q
-        if should_repeat:
-            var_to_repeat.reset()
-            while True:
-                output += header + ", ".join([q.emit() for q in self.qargs]) + ";\n"
-                if not var_to_repeat.increment():
-                    break
-        else:
-            output += header + ", ".join([q.emit() for q in self.qargs]) + ";\n"
-
-        return output
-
-
-class Comparison:
-    def __init__(self, arg1, arg2, op):
-        self.arg1 = arg1
-        self.arg2 = arg2
-        self.op = op
-
-    def perform_operation(self) -> bool:
-        if self.op == "==":
-            return self.arg1.value == self.arg2.value
-        elif self.op == "!=":
-            return self.arg1.value != self.arg2.value
-        elif self.op == ">":
-            return self.arg1.value > self.arg2.value
-        elif self.op == "<":
-            return self.arg1.value < self.arg2.value
-        raise Exception("Invalid operation for Comparison!")
-
-    def compile_time_result(self) -> (bool, bool):
-        if self.arg1.arg_type == "uint" and self.arg2.arg_type == "uint":
-            return True, self.perform_operation()
-        else:
-            return False, None
-
-    def emit(self) -> str:
-        return self.arg1.emit() + self.op + self.arg2.emit()
-
-
-class IfInstruction(Instruction):
-    def __init__(self, comparison, sub_instructions):
-        super().__init__("if")
-        self.comparison = comparison
-        self.sub_instructions = sub_instructions
-
-    def emit_sub_instructions(self):
-        emission = ""
-        for i in self.sub_instructions:
-            emission += i.emit()
-        return emission
-
-    def emit(self) -> str:
-        can_resolve, result = self.comparison.compile_time_result()
-        if can_resolve:
-            if result:
-                return self.emit_sub_instructions()
-            else:
-                return ""
-        else:
-            instructions = self.emit_sub_instructions().split("\n")
-            for i in range(0, len(instructions) - 1):
-                instructions[i] = (
-                    "if (" + self.comparison.emit() + ") " + instructions[i]
-                )
-            return "\n".join(instructions)
-
-
-class QuantumInitialization(Instruction):
-    def __init__(self, name, size, bits):
-        super().__init__("q_init")
-        self.name = name
-        self.size = size
-        self.bits = bits
-
-    def measure_one(self, i):
-        return "x " + self.name + "[" + str(i) + "];\n"
-
-    def emit(self) -> str:
-        emission = "qreg " + self.name + "[" + str(self.size) + "];\n"
-        for i, bit in enumerate(self.bits):
-            if bit == "1":
-                emission += self.measure_one(i)
-        return emission
-
-
-class ClassicalInitialization(Instruction):
-    def __init__(self, name, size, bits):
-        super().__init__("c_init")
-        self.name = name
-        self.size = size
-        self.bits = bits
-
-    def measure_one(self, i):
-        return (
-            "x "
-            + MEASUREMENT_QUBIT_NAME
-            + "[0];\nmeasure "
-            + MEASUREMENT_QUBIT_NAME
-            + "[0] -> "
-            + self.name
+from array import array
+from scope import INITIALIZATION_REGISTER_NAME, MEASUREMENT_QUBIT_NAME
+
+# The opcodes of instructions. Each opcode is followed by a fixed list of operands, except GATE,
+# whose arguments are encoded as described below.
+# GATE: gate name, number of classical arguments, number of quantum arguments, then the arguments
+GATE = 0
+# QREG, CREG: register name, size
+QREG = 1
+CREG = 2
+# MEASURE: quantum register, first qubit, last qubit, classical register, first bit
+MEASURE = 3
+# RESET: quantum register
+RESET = 4
+# MEASURE_REGISTER: quantum register, classical register of the same size
+MEASURE_REGISTER = 5
+# RESET_QUBIT: quantum register, index of the qubit
+RESET_QUBIT = 6
+
+# The kinds of instruction arguments. Each kind is followed by its fields.
+# UINT: value
+UINT = 0
+# BIG_UINT: the decimal digits of a value that does not fit in an operand, as a name
+BIG_UINT = 1
+# C_REG, Q_REG: register name. A gate with a Q_REG argument is applied to each of its qubits.
+C_REG = 2
+Q_REG = 3
+# Q_INDEX: register name, index
+Q_INDEX = 4
+# Q_SLICE: register name, first index, last index
+Q_SLICE = 5
+
+# The number of fields following each kind of argument
+ARGUMENT_FIELDS = [1, 1, 1, 1, 2, 3]
+
+# The positions of the operands that are names, for each opcode other than GATE
+NAME_OPERANDS = {
+    QREG: (0,),
+    CREG: (0,),
+    MEASURE: (0, 3),
+    RESET: (0,),
+    MEASURE_REGISTER: (0, 1),
+    RESET_QUBIT: (0,),
+}
+
+OPERAND_MIN = -(2**63)
+OPERAND_MAX = 2**63 - 1
+
+
+def uint_argument(value) -> tuple:
+    """Returns the operands of a classical argument with a known value"""
+    if OPERAND_MIN <= value <= OPERAND_MAX:
+        return UINT, value
+    return BIG_UINT, str(value)
+
+
+class InstructionList:
+    """
+    A compact list of instructions. Instead of an object per instruction and per argument, every
+    instruction is an opcode, and a run of integer operands in an array shared by all instructions.
+    Gate and register names are interned, and stored in the operands as indexes into names.
+    Instructions within if statements are not nested: each instruction refers to the condition it
+    runs under, which is the tuple of the comparisons of every if statement it is in, outermost
+    first. A comparison is an operator and two classical arguments, each a (kind, value) pair.
+    Conditions are interned too, and the empty condition 0 is for instructions that always run.
+    """
+
+    def __init__(self):
+        self.opcodes = array("B")
+        # The operands of instruction i are operands[offsets[i]:offsets[i + 1]]
+        self.offsets = array("q", [0])
+        self.operands = array("q")
+        self.conditions = array("l")
+        self.names = []
+        self.name_ids = {}
+        self.condition_table = [()]
+        self.condition_ids = {(): 0}
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    # Iterate over the instructions as (opcode, operands, condition) triples, with names given as
+    # strings, in the same form as they are added by extend. Passes over the instructions can
+    # build a new list by extending it with the instructions they keep.
+    def __iter__(self):
+        opcodes = self.opcodes
+        conditions = self.conditions
+        for n in range(len(opcodes)):
+            yield opcodes[n], self.get_operands(n), self.condition_table[conditions[n]]
+
+    def get_operands(self, n) -> list:
+        opcode = self.opcodes[n]
+        operands = self.operands[self.offsets[n] : self.offsets[n + 1]].tolist()
+        names = self.names
+        if opcode != GATE:
+            for i in NAME_OPERANDS[opcode]:
+                operands[i] = names[operands[i]]
+            return operands
+        operands[0] = names[operands[0]]
+        i = 3
+        while i < len(operands):
+            kind = operands[i]
+            if kind != UINT:
+                operands[i + 1] = names[operands[i + 1]]
+            i += 1 + ARGUMENT_FIELDS[kind]
+        return operands
+
+    def intern(self, name) -> int:
+        i = self.name_ids.get(name)
+        if i is None:
+            i = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = i
+        return i
+
+    def intern_condition(self, condition: tuple) -> int:
+        i = self.condition_ids.get(condition)
+        if i is None:
+            i = len(self.condition_table)
+            self.condition_table.append(condition)
+            self.condition_ids[condition] = i
+        return i
+
+    # Add an instruction. Operands that are strings are stored as interned names.
+    def append(self, opcode, operands, condition=0):
+        self.opcodes.append(opcode)
+        for o in operands:
+            self.operands.append(self.intern(o) if type(o) is str else o)
+        self.offsets.append(len(self.operands))
+        self.conditions.append(condition)
+
+    # Add every (opcode, operands, condition) triple produced by an iterable, such as a lowering
+    # generator. Consecutive instructions usually share their condition, so it is only interned
+    # again when it changes.
+    def extend(self, instructions):
+        last = ()
+        condition_id = 0
+        for opcode, operands, condition in instructions:
+            if condition is not last:
+                last = condition
+                condition_id = self.intern_condition(condition)
+            self.append(opcode, operands, condition_id)
+
+
+def gate_arguments(operands) -> tuple:
+    """
+    Splits the operands of a GATE instruction into its name, and lists of its classical and
+    quantum arguments, each argument being a tuple of its kind and fields
+    """
+    name, n_cargs, n_qargs = operands[0:3]
+    arguments = []
+    i = 3
+    while i < len(operands):
+        kind = operands[i]
+        arguments.append(tuple(operands[i : i + 1 + ARGUMENT_FIELDS[kind]]))
+        i += 1 + ARGUMENT_FIELDS[kind]
+    return name, arguments[:n_cargs], arguments[n_cargs:]
+
+
+def gate_operands(name, cargs, qargs) -> list:
+    """Returns the operands of a GATE instruction, from the values returned by gate_arguments"""
+    operands = [name, len(cargs), len(qargs)]
+    for arg in cargs:
+        operands += arg
+    for arg in qargs:
+        operands += arg
+    return operands
+
+
+def argument_text(instructions, kind, i, index=None) -> str:
+    """
+    Returns the text of an argument whose fields start at operand i. A slice is written as the
+    single qubit at index, or at its first index if none is given.
+    """
+    operands = instructions.operands
+    if kind == UINT:
+        return str(operands[i])
+    name = instructions.names[operands[i]]
+    if kind == Q_INDEX:
+        return name + "[" + str(operands[i + 1]) + "]"
+    elif kind == Q_SLICE:
+        if index is None:
+            index = operands[i + 1]
+        return name + "[" + str(index) + "]"
+    return name
+
+
+def emit_gate(instructions, start, write, prefix):
+    operands = instructions.operands
+    names = instructions.names
+    func = names[operands[start]]
+    n_cargs = operands[start + 1]
+    n_qargs = operands[start + 2]
+    i = start + 3
+    cargs = []
+    for _ in range(n_cargs):
+        kind = operands[i]
+        cargs.append(argument_text(instructions, kind, i + 1))
+        i += 1 + ARGUMENT_FIELDS[kind]
+    if n_cargs == 0:
+        header = prefix + func + " "
+    else:
+        header = prefix + func + "(" + ",".join(cargs) + ") "
+    # Quantum arguments are (kind, position of fields) pairs. The last slice is repeated over each
+    # of its qubits, one line per qubit.
+    qargs = []
+    repeat = None
+    for _ in range(n_qargs):
+        kind = operands[i]
+        if kind == Q_SLICE:
+            repeat = len(qargs)
+        qargs.append((kind, i + 1))
+        i += 1 + ARGUMENT_FIELDS[kind]
+    if repeat is None:
+        write(header + ", ".join([argument_text(instructions, k, j) for k, j in qargs]) + ";\n")
+        return
+    first = operands[qargs[repeat][1] + 1]
+    last = max(first, operands[qargs[repeat][1] + 2])
+    for index in range(first, last + 1):
+        texts = [argument_text(instructions, k, j) for k, j in qargs]
+        texts[repeat] = argument_text(instructions, Q_SLICE, qargs[repeat][1], index)
+        write(header + ", ".join(texts) + ";\n")
+
+
+def emit_measure(instructions, start, write, prefix):
+    operands = instructions.operands
+    q_name = instructions.names[operands[start]]
+    q_start = operands[start + 1]
+    q_end = operands[start + 2]
+    r_name = instructions.names[operands[start + 3]]
+    r_start = operands[start + 4]
+    for i in range(0, q_end - q_start + 1):
+        write(
+            prefix
+            + "measure "
+            + q_name
             + "["
-            + str(i)
-            + "];\nreset "
-            + MEASUREMENT_QUBIT_NAME
-            + ";\n"
+            + str(q_start + i)
+            + "] -> "
+            + r_name
+            + "["
+            + str(r_start + i)
+            + "];\n"
         )
 
-    def emit(self) -> str:
-        emission = "creg " + self.name + "[" + str(self.size) + "];\n"
-        for i, bit in enumerate(self.bits):
-            if bit == "1":
-                emission += self.measure_one(i)
-        return emission
-
-
-class MeasurementInstruction(Instruction):
-    def __init__(self, r_name, start, q_name, q_start, q_end):
-        super().__init__("measurement")
-        self.r_name = r_name
-        self.start = start
-        self.q_name = q_name
-        self.q_start = q_start
-        self.q_end = q_end
-
-    def emit(self) -> str:
-        emission = ""
-        length = self.q_end - self.q_start + 1
-        for i in range(0, length):
-            emission += (
-                "measure "
-                + self.q_name
+
+def condition_text(condition: tuple) -> str:
+    """Returns the text written before an instruction that only runs under a condition"""
+    text = ""
+    for op, (kind1, value1), (kind2, value2) in condition:
+        text += "if (" + str(value1) + op + str(value2) + ") "
+    return text
+
+
+def emit_instructions(instructions, write, indent=""):
+    """
+    Writes the OpenQASM code of a list of instructions, by calling write with each line. Every line
+    starts with indent, followed by the condition the instruction runs under.
+    """
+    operands = instructions.operands
+    offsets = instructions.offsets
+    names = instructions.names
+    conditions = instructions.conditions
+    prefixes = [indent + condition_text(c) for c in instructions.condition_table]
+    for n, opcode in enumerate(instructions.opcodes):
+        start = offsets[n]
+        prefix = prefixes[conditions[n]]
+        if opcode == GATE:
+            emit_gate(instructions, start, write, prefix)
+        elif opcode == MEASURE:
+            emit_measure(instructions, start, write, prefix)
+        elif opcode == QREG:
+            write(
+                prefix
+                + "qreg "
+                + names[operands[start]]
+                + "["
+                + str(operands[start + 1])
+                + "];\n"
+            )
+        elif opcode == CREG:
+            write(
+                prefix
+                + "creg "
+                + names[operands[start]]
                 + "["
-                + str(self.q_start + i)
-                + "] -> "
-                + self.r_name
+                + str(operands[start + 1])
+                + "];\n"
+            )
+        elif opcode == RESET:
+            write(prefix + "reset " + names[operands[start]] + ";\n")
+        elif opcode == RESET_QUBIT:
+            write(
+                prefix
+                + "reset "
+                + names[operands[start]]
                 + "["
-                + str(self.start + i)
+                + str(operands[start + 1])
                 + "];\n"
             )
-        return emission
+        elif opcode == MEASURE_REGISTER:
+            write(
+                prefix
+                + "measure "
+                + names[operands[start]]
+                + " -> "
+                + names[operands[start + 1]]
+                + ";\n"
+            )
+        else:
+            raise Exception("Unknown opcode: " + str(opcode))
+
+
+# Returns the instructions that initialize a quantum register under a condition
+def quantum_initialization(name, size, bits, condition=()):
+    yield QREG, (name, size), condition
+    for i, bit in enumerate(bits):
+        if bit == "1":
+            yield GATE, ("x", 0, 1, Q_INDEX, name, i), condition
+
+
+# Returns the instructions that initialize a classical register under a condition. Each bit that
+# is one is set by measuring the measurement qubit after flipping it.
+def classical_initialization(name, size, bits, condition=()):
+    yield CREG, (name, size), condition
+    for i, bit in enumerate(bits):
+        if bit == "1":
+            yield GATE, ("x", 0, 1, Q_INDEX, MEASUREMENT_QUBIT_NAME, 0), condition
+            yield MEASURE, (MEASUREMENT_QUBIT_NAME, 0, 0, name, i), condition
+            yield RESET, (MEASUREMENT_QUBIT_NAME,), condition
+
+
+# Returns the instructions that initialize a classical register under a condition in constant
+# depth, using the initialization register of helper_size qubits. Each bit that is one gets its
+# own qubit, which are flipped, measured and reset together. Bits that are zero are left alone,
+# since a classical register starts at zero. A literal with more ones than the initialization
+# register has qubits is set in several rounds, and after each round only the qubits that were
+# flipped are reset.
+def constant_depth_classical_initialization(
+    name, size, bits, helper_size, condition=()
+):
+    yield CREG, (name, size), condition
+    ones = [i for i, bit in enumerate(bits) if bit == "1"]
+    if not ones:
+        return
+    helper = INITIALIZATION_REGISTER_NAME
+    if len(ones) == helper_size == size:
+        # Every bit is one, so the whole register is flipped and measured at once
+        yield GATE, ("x", 0, 1, Q_REG, helper), condition
+        yield MEASURE_REGISTER, (helper, name), condition
+        yield RESET, (helper,), condition
+        return
+    for start in range(0, len(ones), helper_size):
+        round_bits = ones[start : start + helper_size]
+        for j in range(len(round_bits)):
+            yield GATE, ("x", 0, 1, Q_INDEX, helper, j), condition
+        for j, i in enumerate(round_bits):
+            yield MEASURE, (helper, j, j, name, i), condition
+        # Only the qubits that were flipped need to be reset
+        if len(round_bits) == helper_size:
+            yield RESET, (helper,), condition
+        else:
+            for j in range(len(round_bits)):
+                yield RESET_QUBIT, (helper, j), condition
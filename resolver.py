@@ -1,5 +1,6 @@
 from visitor import Visitor
 from builtin_types import Types
+from symbols import SymbolTable
 
 
 # The Resolver transforms expressions and resolves types of identifiers
@@ -10,16 +11,28 @@ class Resolver(Visitor):
         super().__init__(self.ast.context)
 
         self.current_region = ""
+        # The variables visible from the node being visited
+        self.symbols = SymbolTable()
 
     def visit_function(self, scope):
         name = scope.get_name()
         args = scope.get_arg_list()
+        self.symbols.push()
         for arg in args.get_arguments():
             a_name = arg.get_name()
             type = arg.get_type()
-            scope.register_variable(a_name, type)
+            self.symbols.declare(scope.register_variable(a_name, type))
         self.ast.add_function(name, scope)
 
+    def after_visit_function(self, _):
+        self.symbols.pop()
+
+    def visit_block(self, _):
+        self.symbols.push()
+
+    def after_visit_block(self, _):
+        self.symbols.pop()
+
     def visit_region(self, scope):
         name = scope.get_name()
         self.current_region = name.name
@@ -28,8 +41,9 @@ class Resolver(Visitor):
     def visit_c_decl(self, scope):
         name = scope.get_name()
         v_type = scope.get_type()
-        scope.super_scope.register_variable(name, v_type)
-        if Types.is_register(v_type):
+        self.symbols.declare(scope.super_scope.register_variable(name, v_type))
+        # Registers that are not initialized with a literal are reported by the ErrorChecker
+        if Types.is_register(v_type.name) and scope.get_expression().data == "c_lit":
             bits = scope.get_bits()
             if "1" in bits:
                 self.ast.region_needs_measurement_qubit(self.current_region)
@@ -37,11 +51,11 @@ class Resolver(Visitor):
     def visit_q_decl(self, scope):
         name = scope.get_name()
         v_type = scope.get_type()
-        scope.super_scope.register_variable(name, v_type)
+        self.symbols.declare(scope.super_scope.register_variable(name, v_type))
 
     def visit_v_ident(self, scope):
-        v_type = scope.get_type_for(scope.name)
-        if v_type is None:
+        symbol = self.symbols.lookup(scope.name)
+        if symbol is None:
             scope.raise_compiler_error("V0", info=scope.name)
         else:
-            scope.payload.resolve_type(v_type.name)
+            scope.resolve_symbol(symbol)
@@ -1,14 +1,59 @@
-from payloads import Payload
+from array import array
+from copy import copy
+from operator import attrgetter
+from types import MappingProxyType
+from payloads import (
+    ArgListPayload,
+    ArgPayload,
+    AssignmentPayload,
+    BitPayload,
+    BlockPayload,
+    BoolOpPayload,
+    CallListPayload,
+    ClassicalDeclarationPayload,
+    ClassicalLiteralPayload,
+    FIdentPayload,
+    FunctionCallPayload,
+    FunctionPayload,
+    IfPayload,
+    MeasurementPayload,
+    OpPayload,
+    Payload,
+    QuantumDeclarationPayload,
+    QuantumIndexPayload,
+    QuantumLiteralPayload,
+    QuantumSlicePayload,
+    RIdentPayload,
+    RegionPayload,
+    TypePayload,
+    UIntPayload,
+    VIdentPayload,
+    payload_accessors,
+    payload_fields,
+)
+from symbols import Symbol
 from errors import CompilerError
 from builtin_types import Types
 
 # This is the name of the qubit register used to initialize classical registers with known values.
 MEASUREMENT_QUBIT_NAME = "cregmbit"
 
+# This is the name of the register that the qubits of a region are mapped onto when they are reused.
+QUBIT_POOL_NAME = "qpool"
+
+# This is the name of the register used to initialize classical registers in constant depth.
+INITIALIZATION_REGISTER_NAME = "creginit"
+
+# Scopes share this read-only empty map until a variable is registered in them, since most
+# nodes never have one.
+NO_SYMBOLS = MappingProxyType({})
+
 
 class AST:
-    def __init__(self):
-        self.top_level_scope = Scope(1, 1)
+    def __init__(self, top_level_scope=None):
+        if top_level_scope is None:
+            top_level_scope = Scope(1, 1)
+        self.top_level_scope = top_level_scope
         self.context = self.top_level_scope
         self.functions = {}
         self.regions = {}
@@ -23,6 +68,10 @@ class AST:
         if self.context.super_scope is not None:
             self.context = self.context.super_scope
 
+    # Make a scope the current context directly, without searching for it by ID.
+    def jump_into(self, scope):
+        self.context = scope
+
     def jump_to(self, ID) -> bool:
         s = self.context.scope_with_id(ID)
         if s is not None:
@@ -55,8 +104,22 @@ class Scope:
     packet of data.
     Scope has defined attributes for 'data' and 'children' so it is compatible
     with the traversal algorithms used in Visitor and Transformer.
+    Scopes use __slots__, and only get their own symbol map once a variable
+    is registered in them, to keep the size of large trees down.
     """
 
+    __slots__ = (
+        "line",
+        "column",
+        "var_identifiers",
+        "super_scope",
+        "sub_scopes",
+        "payload",
+        "ID",
+        "data",
+        "children",
+    )
+
     # A global identifier counter, incremented each time a new Scope is initialized
     uid = 0
 
@@ -65,8 +128,7 @@ class Scope:
     ):
         self.line = line
         self.column = column
-        self.var_identifiers = {}
-        self.classical_registry = {}
+        self.var_identifiers = NO_SYMBOLS
         self.super_scope = super_scope
         self.sub_scopes = []
         if scope_payload is not None:
@@ -81,18 +143,24 @@ class Scope:
         # Increment the global ID nonce
         Scope.uid += 1
 
-    # This function override allows attributes of the payload to be accessed directly.
+    # This function override allows attributes of the payload to be accessed directly. The getters and data
+    # attributes of all payload classes are defined on Scope itself (see install_payload_accessors), so this is
+    # only reached for anything else, and is kept for compatibility.
     def __getattr__(self, item):
         # Since all payload functions start with "get_", this will only attempt to retrieve payload 'getter' functions,
         # so a payload attribute won't accidentally get retrieved by mistake.
-        if item[0:4] == "get_" or item in self.payload.__dict__:
+        if item[0:4] == "get_" or item in payload_fields(self.payload):
             return super().__getattribute__("payload").__getattribute__(item)
         else:
             raise AttributeError("Attribute '" + item + "' not found in Scope object")
 
     # Used for internal debugging work
     def debug_print(self, indents=0):
-        p = self.payload.__dict__ if self.payload is not None else {}
+        p = (
+            {f: getattr(self.payload, f) for f in payload_fields(self.payload)}
+            if self.payload is not None
+            else {}
+        )
         print(
             " " * indents
             + self.data
@@ -112,10 +180,69 @@ class Scope:
     def create_sub_scope(self, line, column, payload=None):
         s = Scope(line, column, scope_payload=payload, super_scope=self)
         self.sub_scopes.append(s)
+        self.reset_roles()
         return s
 
+    # Attach an existing node (along with its children) to this node as its last child.
+    def adopt_sub_scope(self, scope):
+        scope.super_scope = self
+        self.sub_scopes.append(scope)
+        self.reset_roles()
+        return scope
+
+    # Replace the children of this node, keeping the list the node already holds
+    def replace_children(self, children):
+        self.sub_scopes[:] = children
+        for c in children:
+            c.super_scope = self
+        self.reset_roles()
+
+    # Forget the children the payload looked up by role, once they have been replaced
+    def reset_roles(self):
+        if self.payload is not None:
+            self.payload.reset_roles()
+
+    # Turn this node into a different kind of node in place, by giving it a new payload. The node keeps
+    # its place in the tree, but loses its children. This lets transformations replace a node without
+    # allocating a new Scope.
+    def rewrite(self, payload):
+        payload.set_scope(self)
+        self.payload = payload
+        self.data = payload.type
+        self.sub_scopes.clear()
+        if self.super_scope is not None and self.super_scope.payload is not None:
+            # The parent may have indexed this node under its old type
+            self.super_scope.payload.reset_roles()
+
+    # Create a copy of this node and all of its children, with super_scope as the parent of the copy.
+    # The line of every copied node is moved by line_offset. The tree is walked with an explicit
+    # stack, so that deeply nested trees do not hit Python's recursion limit. Nodes are copied in the
+    # same order as a recursive copy would, parents before their children.
+    def clone(self, super_scope=None, line_offset=0):
+        root = None
+        # Each entry is a node to copy, and the copy of its parent
+        stack = [(self, super_scope)]
+        while stack:
+            node, parent = stack.pop()
+            payload = None
+            if node.payload is not None:
+                payload = copy(node.payload)
+                payload.reset_roles()
+            s = Scope(
+                node.line + line_offset,
+                node.column,
+                scope_payload=payload,
+                super_scope=parent,
+            )
+            if root is None:
+                root = s
+            else:
+                parent.sub_scopes.append(s)
+            stack += [(child, s) for child in reversed(node.children)]
+        return root
+
     # Store a variable's type and reference to its declaration in the tree
-    # inside the var_identifiers hash map.
+    # as a symbol inside the var_identifiers hash map, and return the symbol.
     def register_variable(self, name, v_type):
         # Check that the type is valid
         if not Types.is_valid(v_type.name):
@@ -126,50 +253,48 @@ class Scope:
             else:
                 name.raise_compiler_error("C0", info=name.name)
         else:
-            self.var_identifiers[name.name] = (v_type, name)
+            if self.var_identifiers is NO_SYMBOLS:
+                self.var_identifiers = {}
+            symbol = Symbol(name.name, v_type, name, self)
+            self.var_identifiers[name.name] = symbol
+            return symbol
 
-    # Attempt to retrieve a variable's type from identifier metadata, and recursively check parent nodes
-    # if this fails.
+    # Link a variable identifier to the symbol of the variable it refers to
+    def resolve_symbol(self, symbol):
+        self.payload.resolve_symbol(symbol)
+
+    # Attempt to retrieve a variable's symbol from this scope, and check parent nodes if this fails.
+    # Passes that run after the Resolver should use the symbol linked to an identifier instead.
+    def lookup_symbol(self, v_name):
+        scope = self
+        while scope is not None:
+            if v_name in scope.var_identifiers:
+                return scope.var_identifiers[v_name]
+            scope = scope.super_scope
+        return None
+
+    # Attempt to retrieve a variable's type from identifier metadata
     def get_type_for(self, v_name):
-        if v_name in self.var_identifiers:
-            return self.var_identifiers[v_name][0]
-        else:
-            if self.super_scope is not None:
-                t = self.super_scope.get_type_for(v_name)
-                return t
-            return None
+        symbol = self.lookup_symbol(v_name)
+        return symbol.v_type if symbol is not None else None
 
-    # Attempt to retrieve a variable's declaration scope from identifier metadata, and recursively check parent nodes
-    # for this data if this fails.
+    # Attempt to retrieve a variable's declaration scope from identifier metadata
     def get_scope_for(self, v_name):
-        if v_name in self.var_identifiers:
-            return self.var_identifiers[v_name][1]
-        else:
-            if self.super_scope is not None:
-                t = self.super_scope.get_type_for(v_name)
-                return t
-            return None
+        symbol = self.lookup_symbol(v_name)
+        return symbol.name_scope if symbol is not None else None
 
-    # Define a value for a constant variable, and store it in this scope's hash map
+    # Define a value for a constant variable, and store it in the variable's symbol
     def set_classical_value(self, name, value):
-        if name in self.var_identifiers:
-            self.classical_registry[name] = value
-            return True
-        else:
-            if self.super_scope is not None:
-                t = self.super_scope.set_classical_value(name, value)
-                return t
+        symbol = self.lookup_symbol(name)
+        if symbol is None:
             return False
+        symbol.value = value
+        return True
 
-    # Attempt to retrieve the value of a constant variable, and recursively check parent nodes for this data if
-    # this fails.
+    # Attempt to retrieve the value of a constant variable
     def get_classical_value(self, name):
-        if name in self.classical_registry:
-            return self.classical_registry[name]
-        else:
-            if self.super_scope is not None:
-                return self.super_scope.get_classical_value(name)
-            return None
+        symbol = self.lookup_symbol(name)
+        return symbol.value if symbol is not None else None
 
     # Raise a compiler error with this scope as the origin of the error
     def raise_compiler_error(self, error_code, info=""):
@@ -184,3 +309,453 @@ class Scope:
             if s is not None:
                 return s
         return None
+
+
+# The payload class for each type of node that can be stored in an ASTArena. The position of a type in this
+# list is the kind stored for its nodes. The first kind is the top level scope, which has no payload.
+ARENA_KINDS = [
+    ("", None),
+    ("function", FunctionPayload),
+    ("function_call", FunctionCallPayload),
+    ("assignment", AssignmentPayload),
+    ("block", BlockPayload),
+    ("operation", OpPayload),
+    ("b_expr", BoolOpPayload),
+    ("if", IfPayload),
+    ("f_ident", FIdentPayload),
+    ("v_ident", VIdentPayload),
+    ("r_ident", RIdentPayload),
+    ("type", TypePayload),
+    ("uint", UIntPayload),
+    ("call_list", CallListPayload),
+    ("arg_list", ArgListPayload),
+    ("arg", ArgPayload),
+    ("region", RegionPayload),
+    ("q_slice", QuantumSlicePayload),
+    ("q_lit", QuantumLiteralPayload),
+    ("c_decl", ClassicalDeclarationPayload),
+    ("c_lit", ClassicalLiteralPayload),
+    ("q_decl", QuantumDeclarationPayload),
+    ("bit", BitPayload),
+    ("q_index", QuantumIndexPayload),
+    ("measurement", MeasurementPayload),
+]
+ARENA_KIND_IDS = {name: i for i, (name, _) in enumerate(ARENA_KINDS)}
+
+# Node types whose value is an index into the arena's string table
+ARENA_NAMED_KINDS = {"f_ident", "v_ident", "r_ident", "type"}
+
+# The kinds of the nodes that have each data attribute, which ArenaScope reads from the arena
+ARENA_FIELD_KINDS = {
+    "name": {ARENA_KIND_IDS[kind] for kind in ARENA_NAMED_KINDS},
+    "value": {ARENA_KIND_IDS["uint"], ARENA_KIND_IDS["bit"]},
+    "operation": {ARENA_KIND_IDS["operation"], ARENA_KIND_IDS["b_expr"]},
+    "is_empty": {ARENA_KIND_IDS["arg_list"]},
+    "symbol": {ARENA_KIND_IDS["v_ident"]},
+    "v_type": {ARENA_KIND_IDS["v_ident"]},
+}
+
+# Stored in place of a value that does not fit in the value array, which is then kept in large_values
+ARENA_LARGE_VALUE = -(2 ** 63)
+
+NO_NODE = -1
+
+
+class ASTArena:
+    """
+    An alternative storage for the abstract syntax tree, for very large programs. Instead of a Scope
+    and a Payload object per node, every node is a row across a set of typed arrays: its kind, its
+    parent, its first child, last child and next sibling, its line and column, and a single value
+    (a number, a bit, or the index of an interned name or operation). Node 0 is the top level scope.
+    Nodes are accessed through ArenaScope views, which offer the same accessors as Scope, so the
+    compiler passes can run on either storage.
+    Data that only a few nodes have, such as registered variables and resolved symbols, is kept
+    in dictionaries keyed by node index.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.parents = array("i")
+        self.first_children = array("i")
+        self.last_children = array("i")
+        self.next_siblings = array("i")
+        self.lines = array("i")
+        self.columns = array("i")
+        self.values = array("q")
+        self.large_values = {}
+        # Interned names and operations
+        self.strings = []
+        self.string_ids = {}
+        # Sparse per-node data
+        self.var_identifiers = {}
+        self.symbols = {}
+        self.add_node(None, 1, 1)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def view(self, index):
+        return ArenaScope(self, index)
+
+    def intern(self, s) -> int:
+        i = self.string_ids.get(s)
+        if i is None:
+            i = len(self.strings)
+            self.strings.append(s)
+            self.string_ids[s] = i
+        return i
+
+    # Returns the kind of a payload, and the value stored for it
+    def encode(self, payload):
+        if payload is None:
+            return ARENA_KIND_IDS[""], 0
+        kind = payload.type
+        if kind in ARENA_NAMED_KINDS:
+            value = self.intern(payload.name)
+        elif kind == "uint":
+            value = payload.value
+        elif kind == "bit":
+            value = 1 if payload.value else 0
+        elif kind in ("operation", "b_expr"):
+            value = self.intern(payload.operation)
+        elif kind == "arg_list":
+            value = 1 if payload.is_empty else 0
+        else:
+            value = 0
+        return ARENA_KIND_IDS[kind], value
+
+    def set_value(self, index, value):
+        try:
+            self.values[index] = value
+            self.large_values.pop(index, None)
+        except OverflowError:
+            self.values[index] = ARENA_LARGE_VALUE
+            self.large_values[index] = value
+
+    # Add a node for a payload, with the given nodes as its children, and return its index.
+    def add_node(self, payload, line, column, sub_scopes=()) -> int:
+        index = len(self.kinds)
+        kind, value = self.encode(payload)
+        self.kinds.append(kind)
+        self.parents.append(NO_NODE)
+        self.first_children.append(NO_NODE)
+        self.last_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self.lines.append(line)
+        self.columns.append(column)
+        self.values.append(0)
+        self.set_value(index, value)
+        for child in sub_scopes:
+            self.append_child(index, child)
+        return index
+
+    # Store a different payload for a node in place, removing its children
+    def rewrite(self, index, payload):
+        kind, value = self.encode(payload)
+        self.kinds[index] = kind
+        self.set_value(index, value)
+        self.first_children[index] = NO_NODE
+        self.last_children[index] = NO_NODE
+        self.symbols.pop(index, None)
+
+    def append_child(self, parent, child):
+        self.parents[child] = parent
+        self.next_siblings[child] = NO_NODE
+        last = self.last_children[parent]
+        if last == NO_NODE:
+            self.first_children[parent] = child
+        else:
+            self.next_siblings[last] = child
+        self.last_children[parent] = child
+
+    # Copy a Scope tree (such as a node created by a Transformer) into the arena, and return its index.
+    # The tree is walked with an explicit stack instead of recursion. Children are added before their
+    # parents, in the same order as a recursive copy would add them.
+    def import_scope(self, scope) -> int:
+        imported = []
+        # Each entry is a node, the list its index is added to once it is added, and the indexes of
+        # its children, or None if its children have not been visited yet
+        stack = [(scope, imported, None)]
+        while stack:
+            node, siblings, children = stack[-1]
+            if children is None:
+                children = []
+                stack[-1] = (node, siblings, children)
+                stack += [(c, children, None) for c in reversed(node.children)]
+            else:
+                stack.pop()
+                siblings.append(
+                    self.add_node(node.payload, node.line, node.column, children)
+                )
+        return imported[0]
+
+    # Replace the children of a node. Children may be views into this arena or Scope objects.
+    def set_children(self, parent, children):
+        self.first_children[parent] = NO_NODE
+        self.last_children[parent] = NO_NODE
+        for c in children:
+            if isinstance(c, ArenaScope) and c.arena is self:
+                child = c.index
+            else:
+                child = self.import_scope(c)
+            self.append_child(parent, child)
+
+    def child_indexes(self, parent) -> list:
+        indexes = []
+        child = self.first_children[parent]
+        while child != NO_NODE:
+            indexes.append(child)
+            child = self.next_siblings[child]
+        return indexes
+
+    def get_value(self, index):
+        value = self.values[index]
+        if value == ARENA_LARGE_VALUE:
+            return self.large_values[index]
+        return value
+
+    # Create a temporary payload object holding the data of a node, for code that needs the payload
+    # itself, such as debug_print. The getters of ArenaScope do not use it. Changes to the payload
+    # object are not stored in the arena.
+    def payload_for(self, view):
+        index = view.index
+        kind, cls = ARENA_KINDS[self.kinds[index]]
+        if cls is None:
+            return None
+        payload = cls.__new__(cls)
+        payload.type = kind
+        payload.owning_scope = view
+        payload.roles = None
+        value = self.values[index]
+        if kind in ARENA_NAMED_KINDS:
+            payload.name = self.strings[value]
+            if kind == "v_ident":
+                payload.symbol = self.symbols.get(index)
+                payload.v_type = view.v_type
+        elif kind == "uint":
+            payload.value = self.get_value(index)
+        elif kind == "bit":
+            payload.value = value == 1
+        elif kind in ("operation", "b_expr"):
+            payload.operation = self.strings[value]
+        elif kind == "arg_list":
+            payload.is_empty = value == 1
+        return payload
+
+
+class ArenaScope:
+    """
+    A view of a single node of an ASTArena, with the same attributes and accessors as Scope.
+    Views are created whenever a node is reached, so they should not be compared by identity.
+    """
+
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ArenaScope)
+            and self.arena is other.arena
+            and self.index == other.index
+        )
+
+    def __hash__(self):
+        return hash(self.index)
+
+    @property
+    def ID(self):
+        return self.index
+
+    @property
+    def line(self):
+        return self.arena.lines[self.index]
+
+    @property
+    def column(self):
+        return self.arena.columns[self.index]
+
+    @property
+    def data(self):
+        return ARENA_KINDS[self.arena.kinds[self.index]][0]
+
+    @property
+    def type(self):
+        return self.data
+
+    @property
+    def payload(self):
+        return self.arena.payload_for(self)
+
+    @property
+    def super_scope(self):
+        parent = self.arena.parents[self.index]
+        return ArenaScope(self.arena, parent) if parent != NO_NODE else None
+
+    # The children are a new tuple of views on every access, so changing them in place, which would
+    # not change the arena, fails. They are changed by assigning to children or with replace_children.
+    @property
+    def children(self):
+        return tuple(
+            ArenaScope(self.arena, i) for i in self.arena.child_indexes(self.index)
+        )
+
+    @children.setter
+    def children(self, children):
+        self.arena.set_children(self.index, children)
+
+    sub_scopes = children
+
+    # Return the kind of the node, raising the AttributeError a Scope would if its payload does not
+    # have the data attribute
+    def field_kind(self, name) -> int:
+        kind = self.arena.kinds[self.index]
+        if kind not in ARENA_FIELD_KINDS[name]:
+            raise AttributeError(
+                "'" + self.data + "' node has no attribute '" + name + "'"
+            )
+        return kind
+
+    @property
+    def name(self):
+        self.field_kind("name")
+        return self.arena.strings[self.arena.values[self.index]]
+
+    @property
+    def value(self):
+        if self.field_kind("value") == ARENA_KIND_IDS["bit"]:
+            return self.arena.values[self.index] == 1
+        return self.arena.get_value(self.index)
+
+    @property
+    def operation(self):
+        self.field_kind("operation")
+        return self.arena.strings[self.arena.values[self.index]]
+
+    @property
+    def is_empty(self):
+        self.field_kind("is_empty")
+        return self.arena.values[self.index] == 1
+
+    @property
+    def symbol(self):
+        self.field_kind("symbol")
+        return self.arena.symbols.get(self.index)
+
+    @property
+    def v_type(self):
+        self.field_kind("v_type")
+        symbol = self.arena.symbols.get(self.index)
+        return symbol.v_type.name if symbol is not None else ""
+
+    # The getters of the payload classes are called on the view itself, which has the same data
+    # attributes as the payload, so a view is its own owning scope
+    @property
+    def owning_scope(self):
+        return self
+
+    def find_role(self, data):
+        child = self.arena.first_children[self.index]
+        while child != NO_NODE:
+            if ARENA_KINDS[self.arena.kinds[child]][0] == data:
+                return ArenaScope(self.arena, child)
+            child = self.arena.next_siblings[child]
+        return None
+
+    # Views look up children by role without caching them
+    def reset_roles(self):
+        pass
+
+    @property
+    def var_identifiers(self):
+        return self.arena.var_identifiers.get(self.index, NO_SYMBOLS)
+
+    @var_identifiers.setter
+    def var_identifiers(self, var_identifiers):
+        self.arena.var_identifiers[self.index] = var_identifiers
+
+    def resolve_symbol(self, symbol):
+        self.arena.symbols[self.index] = symbol
+
+    def rewrite(self, payload):
+        self.arena.rewrite(self.index, payload)
+
+    def replace_children(self, children):
+        self.arena.set_children(self.index, children)
+
+    def create_sub_scope(self, line, column, payload=None):
+        index = self.arena.add_node(payload, line, column)
+        self.arena.append_child(self.index, index)
+        return ArenaScope(self.arena, index)
+
+    def adopt_sub_scope(self, scope):
+        self.arena.set_children(self.index, self.children + (scope,))
+        return ArenaScope(self.arena, self.arena.last_children[self.index])
+
+    # These work the same way for both storages
+    debug_print = Scope.debug_print
+    register_variable = Scope.register_variable
+    lookup_symbol = Scope.lookup_symbol
+    get_type_for = Scope.get_type_for
+    get_scope_for = Scope.get_scope_for
+    set_classical_value = Scope.set_classical_value
+    get_classical_value = Scope.get_classical_value
+    raise_compiler_error = Scope.raise_compiler_error
+    scope_with_id = Scope.scope_with_id
+
+
+def forward_getter(name, methods: dict):
+    # methods maps each payload class that has the getter to its function, so the getter is looked up
+    # once per payload class instead of by name on every call
+    def getter(self, *args):
+        payload = self.payload
+        method = methods.get(payload.__class__)
+        if method is None:
+            raise AttributeError(
+                "'" + type(payload).__name__ + "' object has no attribute '" + name + "'"
+            )
+        return method(payload, *args)
+
+    getter.__name__ = name
+    return getter
+
+
+# Arena nodes have no payload objects, so the getter of the payload class of the node's kind is
+# called on the view itself
+def forward_arena_getter(name, methods: dict):
+    kind_methods = [methods.get(cls) for _, cls in ARENA_KINDS]
+
+    def getter(self, *args):
+        method = kind_methods[self.arena.kinds[self.index]]
+        if method is None:
+            raise AttributeError(
+                "'" + self.data + "' node has no attribute '" + name + "'"
+            )
+        return method(self, *args)
+
+    getter.__name__ = name
+    return getter
+
+
+def forward_field(name):
+    return property(attrgetter("payload." + name))
+
+
+# Define every payload getter and data attribute on Scope, forwarding to the payload. This way they are
+# found by normal attribute lookup, instead of going through Scope.__getattr__ on every access.
+# ArenaScope reads data attributes from the arena itself, so it only gets the getters.
+def install_payload_accessors():
+    getters, fields = payload_accessors()
+    for name, methods in getters.items():
+        if not hasattr(Scope, name):
+            setattr(Scope, name, forward_getter(name, methods))
+        if not hasattr(ArenaScope, name):
+            setattr(ArenaScope, name, forward_arena_getter(name, methods))
+    for name in fields - {"owning_scope", "roles"}:
+        if not hasattr(Scope, name):
+            setattr(Scope, name, forward_field(name))
+
+
+install_payload_accessors()
@@ -29,6 +29,12 @@ class StandardLibrary:
         "rz": [("rotation", "Const"), ("target", "Q")],
     }
 
+    # Functions that undo themselves when applied twice to the same qubits
+    self_inverse = ["hadamard", "cx", "not", "y", "z", "swap", "ccx"]
+
+    # Functions that rotate a qubit by the angle given as their first argument
+    rotations = ["rx", "ry", "rz"]
+
     @staticmethod
     def is_standard(function_name):
         return function_name in StandardLibrary.functions
@@ -40,3 +46,16 @@ class StandardLibrary:
     @staticmethod
     def get_standard_args(function_name):
         return StandardLibrary.args[function_name]
+
+    # The standard functions are looked up by their OpenQASM names once the program is transpiled
+    @staticmethod
+    def is_self_inverse_gate(gate_name):
+        return gate_name in [
+            StandardLibrary.functions[f] for f in StandardLibrary.self_inverse
+        ]
+
+    @staticmethod
+    def is_rotation_gate(gate_name):
+        return gate_name in [
+            StandardLibrary.functions[f] for f in StandardLibrary.rotations
+        ]
@@ -2,16 +2,22 @@ from standard_library import StandardLibrary
 
 
 class State:
-    def __init__(self, ast):
+    def __init__(self, ast, regions=True):
         self.ast = ast
         self.functions = {}
         self.regions = {}
-        for name in ast.regions.keys():
-            region = ast.regions[name][0]
-            self.register_region(name, region)
         for name in ast.functions.keys():
             function = ast.functions[name]
             self.register_function(name, function)
+        if regions:
+            self.register_regions()
+
+    # Regions are registered separately from functions, since registering a region records whether
+    # it needs a measurement qubit, which is only known once the whole region has been analysed.
+    def register_regions(self):
+        for name in self.ast.regions.keys():
+            region = self.ast.regions[name][0]
+            self.register_region(name, region)
 
     def register_function(self, name, scope):
         block = scope.get_block()
@@ -22,19 +28,30 @@ class State:
         else:
             self.functions[name] = (classical_args, quantum_args, block)
 
+    # The blocks of if statements are walked with an explicit stack instead of recursion, so that
+    # deeply nested if statements do not hit Python's recursion limit
     def find_dependencies(self, scope) -> set:
         dependencies = set()
-        for stmt in scope.children:
-            if stmt.data == "function_call":
-                name = stmt.get_name().name
-                if not StandardLibrary.is_standard(name):
-                    dependencies.add(name)
-            elif stmt.data == "if":
-                dependencies = dependencies.union(
-                    self.find_dependencies(stmt.get_block())
-                )
+        blocks = [scope]
+        while blocks:
+            for stmt in blocks.pop().children:
+                if stmt.data == "function_call":
+                    name = stmt.get_name().name
+                    if not StandardLibrary.is_standard(name):
+                        dependencies.add(name)
+                elif stmt.data == "if":
+                    blocks.append(stmt.get_block())
         return dependencies
 
+    # Find the dependencies of the given regions (or of every region) again, after statements
+    # have been removed from them
+    def update_dependencies(self, names=None):
+        if names is None:
+            names = list(self.regions.keys())
+        for name in names:
+            qubits, block, needs_mbit, _ = self.regions[name]
+            self.regions[name] = (qubits, block, needs_mbit, self.find_dependencies(block))
+
     def register_region(self, name, scope):
         qubits: int = scope.get_qubit_cap()
         block = scope.get_block()
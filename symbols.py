@@ -0,0 +1,58 @@
+class Symbol:
+    """
+    A declared variable. A symbol is stored in the scope its variable is declared in, and
+    holds the variable's type, the identifier it was declared with, and its value once the
+    value is known at compile time.
+    The Resolver links every identifier to the symbol it refers to, so later passes can find
+    a variable's declaration without searching through the tree.
+    """
+
+    __slots__ = ("name", "v_type", "name_scope", "scope", "value")
+
+    def __init__(self, name, v_type, name_scope, scope):
+        self.name = name
+        self.v_type = v_type
+        self.name_scope = name_scope
+        self.scope = scope
+        self.value = None
+
+    # Returns the node of the declaration statement of the variable
+    def get_declaration(self):
+        return self.name_scope.super_scope
+
+
+class SymbolTable:
+    """
+    A scoped hash map from variable names to symbols. A frame is pushed when a block or function
+    is entered, and popped when it is left, which removes the symbols declared in it. Looking up
+    a name takes constant time, however deeply the current scope is nested.
+    """
+
+    def __init__(self):
+        # Maps each name to the symbols declared with it, with the innermost symbol last
+        self.bindings = {}
+        # The names declared in each open frame
+        self.frames = []
+
+    def push(self):
+        self.frames.append([])
+
+    def pop(self):
+        for name in self.frames.pop():
+            symbols = self.bindings[name]
+            symbols.pop()
+            if len(symbols) == 0:
+                del self.bindings[name]
+
+    def declare(self, symbol):
+        if symbol.name in self.bindings:
+            self.bindings[symbol.name].append(symbol)
+        else:
+            self.bindings[symbol.name] = [symbol]
+        self.frames[-1].append(symbol.name)
+
+    def lookup(self, name):
+        symbols = self.bindings.get(name)
+        if symbols is None:
+            return None
+        return symbols[-1]
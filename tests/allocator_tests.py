@@ -0,0 +1,109 @@
+import unittest
+from allocator import QubitAllocator
+from tests.pipeline import transpile
+
+
+def allocate(contents, creg_initialization="width"):
+    transpiler = transpile(contents, creg_initialization)
+    allocator = QubitAllocator()
+    for name, program in transpiler.programs.items():
+        allocator.allocate_program(name, program)
+    return transpiler.programs, allocator
+
+
+class TestQubitAllocator(unittest.TestCase):
+    def test_measured_and_block_scoped_qubits_are_reused(self):
+        programs, allocator = allocate(
+            """region A<9> {
+                Q[] q = ^010^;
+                C[] c = #101;
+                C[] d = #00;
+                hadamard(q[0:2]);
+                c[0:] <- q[0:2];
+                if c == 1 {
+                    Q[] t = ^11^;
+                    cx(t[0], t[1]);
+                }
+                Q[] u = ^00^;
+                hadamard(u[0:1]);
+            }"""
+        )
+        self.assertEqual(allocator.widths, {"A": (8, 3)})
+        self.assertEqual(
+            allocator.report(), "Qubit allocation in region 'A': 8 qubits mapped onto 3"
+        )
+        self.assertEqual(
+            programs["A"].emit().split("\n")[:-1],
+            [
+                "qreg qpool[3];",
+                "x qpool[0];",
+                "creg c[3];",
+                # The measurement qubit is free again after setting each bit
+                "x qpool[1];",
+                "measure qpool[1] -> c[0];",
+                "reset qpool[1];",
+                "x qpool[1];",
+                "measure qpool[1] -> c[2];",
+                "reset qpool[1];",
+                "creg d[2];",
+                "h qpool[1];",
+                "h qpool[0];",
+                "h qpool[2];",
+                "measure qpool[1] -> c[0];",
+                "measure qpool[0] -> c[1];",
+                "measure qpool[2] -> c[2];",
+                # Measured qubits are reset before they are reused
+                "reset qpool[0];",
+                "if (c==1) x qpool[0];",
+                "reset qpool[1];",
+                "if (c==1) x qpool[1];",
+                "if (c==1) cx qpool[0], qpool[1];",
+                "reset qpool[0];",
+                "h qpool[0];",
+                "reset qpool[1];",
+                "h qpool[1];",
+            ],
+        )
+
+    def test_unmeasured_qubits_stay_live(self):
+        programs, allocator = allocate(
+            """region A<4> {
+                Q[] q = ^00^;
+                hadamard(q[0]);
+                Q[] r = ^0^;
+                hadamard(r[0]);
+            }"""
+        )
+        self.assertEqual(allocator.widths, {"A": (3, 2)})
+        self.assertEqual(
+            programs["A"].emit(), "qreg qpool[2];\nh qpool[0];\nh qpool[1];\n"
+        )
+        self.assertFalse(programs["A"].measurement_qubit_needed)
+
+    def test_unused_qubits_are_not_reset(self):
+        programs, allocator = allocate(
+            """region A<4> {
+                C[] c = #101;
+                C[] d = #1;
+                Q[] q = ^0^;
+                hadamard(q[0]);
+            }""",
+            "depth",
+        )
+        # The initialization register has a qubit for each one of c, and is mapped with q
+        self.assertEqual(allocator.widths, {"A": (3, 2)})
+        # Only the qubits of the initialization register that set a bit of d are reset
+        self.assertEqual(
+            programs["A"].emit().split("\n")[-6:-1],
+            [
+                "creg d[1];",
+                "x qpool[0];",
+                "measure qpool[0] -> d[0];",
+                "reset qpool[0];",
+                "h qpool[0];",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
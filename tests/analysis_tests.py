@@ -0,0 +1,113 @@
+import unittest
+from analysis import SemanticAnalyzer
+from checker import ErrorChecker
+from computation import ComputationHandler
+from errors import CompilerError
+from input_parser import build_ast
+from output import Output
+from pruner import BranchPruner
+from resolver import Resolver
+from state import State
+from transpiler import Transpiler
+
+
+def separate_analysis(ast):
+    Resolver(ast).traverse()
+    state = State(ast)
+    ErrorChecker(ast, state).traverse()
+    ComputationHandler(ast).traverse()
+    return state
+
+
+def fused_analysis(ast):
+    analyzer = SemanticAnalyzer(ast)
+    analyzer.traverse()
+    return analyzer.state
+
+
+def compile_with(analysis, contents):
+    """Compile a program, returning its generated code, or the code and position of its error"""
+    ast = build_ast(contents)
+    try:
+        state = analysis(ast)
+    except CompilerError as e:
+        return e.error_code, e.line, e.column
+    BranchPruner(ast, state).traverse()
+    transpiler = Transpiler(state)
+    transpiler.transpile()
+    return Output.generate_output(transpiler.programs, transpiler.gates)
+
+
+class TestFusedAnalysis(unittest.TestCase):
+    def assertSameResult(self, contents):
+        self.assertEqual(
+            compile_with(fused_analysis, contents),
+            compile_with(separate_analysis, contents),
+        )
+
+    def test_example_programs(self):
+        for file_name in ["test.funq", "test_suite.funq"]:
+            with open(file_name) as f:
+                self.assertSameResult(f.read())
+
+    def test_constants_and_functions(self):
+        self.assertSameResult(
+            """region A<4> {
+                Q[] q = ^0101^;
+                Const a = 2 * 3 + 1;
+                Const b = a - 4 / 2;
+                if a > b { rz(b, q[1]); F(a, q[0]); }
+                C[] c = #0100;
+                c[0:] <- q[0:3];
+            }
+            func F(x: Const, y: Q) { rz(x, y); }"""
+        )
+
+    def test_errors(self):
+        programs = [
+            "region A<1> { Q[] q = ^0^; hadamard(r[0]); }",
+            "region A<1> { Q[] q = ^00^; }",
+            "region A<2> { Q[] q = ^00^; C[] c = #1; }",
+            "region A<2> { Q[] q = ^00^; hadamard(q[2]); }",
+            "region A<2> { Q[] q = ^00^; hadamard(q[0:2]); }",
+            "region A<2> { Q[] q = ^00^; C[] c = #00; c[0:] <- q[0:1]; c[0:] <- q[0:1]; }",
+            "region A<2> { Q[] q = ^00^; C[] c = #00; c[0:] <- q[0:1]; hadamard(q[0]); }",
+            "region A<2> { Q[] q = ^00^; C[] c = #0; c[0:] <- q[0:1]; }",
+            "region A<2> { Q[] q = ^00^; Const a = 1; Const a = 2; }",
+            "region A<2> { Q[] q = ^00^; Const a = q + 1; }",
+            "region A<2> { Q[] q = ^00^; C[] c = 1; }",
+            "region A<2> { Q[] q = ^00^; G(q[0]); }",
+            "region A<2> { Q[] q = ^00^; hadamard(q[0], q[1]); }",
+            "region A<2> { Q[] q = ^00^; rz(q[0], q[1]); }",
+            "func F(x: Q) { F(x); }",
+            "func F(x: Const) { }",
+            "func F(x: C[], y: Q) { }",
+            "func F(x: Q) { Q[] q = ^0^; }",
+            "func F(x: Q) { } func F(y: Q) { }",
+        ]
+        for contents in programs:
+            with self.subTest(contents=contents):
+                result = compile_with(separate_analysis, contents)
+                self.assertIsInstance(result, tuple)
+                self.assertEqual(compile_with(fused_analysis, contents), result)
+
+    def test_first_error_of_several(self):
+        programs = [
+            "region A<2> { Q[] q = ^00^; hadamard(q[2]); hadamard(r[0]); }",
+            "region A<1> { Q[] q = ^00^; } region B<1> { Q[] r = ^0^; hadamard(zz[0]); }",
+            "region A<2> { Q[] q = ^00^; Const a = q + 1; hadamard(q[3]); }",
+            "region A<2> { Q[] q = ^00^; Const a = q + 1; Const b = zz + 1; }",
+            "region A<2> { Q[] q = ^0^; hadamard(q[3]); Q[] r = ^00^; }",
+            "region A<2> { Q[] q = ^00^; Const a = q + 1; Const c = a * 2; }",
+            "func F(x: Q) { Q[] q = ^0^; } region A<1> { Q[] q = ^00^; }",
+            "region A<1> { Q[] q = ^00^; } func F(x: C[]) { G(x); }",
+        ]
+        for contents in programs:
+            with self.subTest(contents=contents):
+                result = compile_with(separate_analysis, contents)
+                self.assertIsInstance(result, tuple)
+                self.assertEqual(compile_with(fused_analysis, contents), result)
+
+
+if __name__ == "__main__":
+    unittest.main()
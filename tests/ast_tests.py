@@ -1,5 +1,29 @@
 import unittest
-from input_parser import parse
+from checker import ErrorChecker
+from errors import CompilerError
+from input_parser import build_ast, parse
+from payloads import FIdentPayload, FunctionCallPayload
+from resolver import Resolver
+from scope import ASTArena, Scope
+from state import State
+from visitor import Transformer, Visitor
+
+
+class RenameCalls(Transformer):
+    def transform_f_ident(self, scope):
+        if scope.super_scope.data != "function_call":
+            return scope
+        return Scope(
+            scope.line,
+            scope.column,
+            scope_payload=FIdentPayload("renamed"),
+            super_scope=scope.super_scope,
+        )
+
+
+class BrokenVisitor(Visitor):
+    def visit_region(self, scope):
+        return scope.no_such_attribute
 
 
 class TestASTBuild(unittest.TestCase):
@@ -13,6 +37,87 @@ class TestASTBuild(unittest.TestCase):
         # Perform verification on the tree
         self.assertTrue(len(tree.children) == 1)
 
+    def test_roles_follow_replaced_children(self):
+        ast = build_ast("region Test<5> { Q[] q1 = ^000^; hadamard(q1[0]); }")
+        call = ast.top_level_scope.children[0].get_block().children[1]
+        self.assertEqual(call.get_name().name, "hadamard")
+        RenameCalls(ast.top_level_scope).traverse()
+        self.assertEqual(call.get_name().name, "renamed")
+
+    def test_roles_follow_added_children(self):
+        ast = build_ast("region Test<5> { Q[] q1 = ^000^; }")
+        region = ast.top_level_scope.children[0]
+        block = region.get_block()
+        region.replace_children([c for c in region.children if c is not block])
+        with self.assertRaises(Exception):
+            region.get_block()
+        region.adopt_sub_scope(block)
+        self.assertIs(region.get_block(), block)
+        self.assertIsNone(block.payload.find_role("function_call"))
+        call = block.create_sub_scope(1, 1, FunctionCallPayload())
+        self.assertIs(block.payload.find_role("function_call"), call)
+
+    def test_payload_accessors_are_defined_on_scope(self):
+        ast = build_ast("region Test<5> { Q[] q1 = ^000^; }")
+        region = ast.top_level_scope.children[0]
+        self.assertIn("get_qubit_cap", vars(Scope))
+        self.assertIn("name", vars(Scope))
+        self.assertEqual(region.get_qubit_cap(), 5)
+        self.assertEqual(region.get_name().name, "Test")
+        with self.assertRaises(AttributeError):
+            region.get_block().get_qubit_cap()
+
+    def test_visitor_errors_are_not_swallowed(self):
+        ast = build_ast("region Test<5> { Q[] q1 = ^000^; }")
+        with self.assertRaises(AttributeError):
+            BrokenVisitor(ast.top_level_scope).traverse()
+
+    def test_deep_if_nesting_does_not_recurse(self):
+        depth = 3000
+        contents = (
+            "region A<2> { Q[] q = ^0^; C[] c = #0; "
+            + "if c == 1 { " * depth
+            + "F(q[0]);"
+            + " }" * depth
+            + " } func F(x: Q) { hadamard(x); }"
+        )
+        for arena in (False, True):
+            ast = build_ast(contents, arena=arena)
+            Resolver(ast).traverse()
+            self.assertEqual(State(ast).regions["A"][3], {"f"})
+        region = build_ast(contents).top_level_scope.children[0]
+        copy = region.clone(line_offset=1)
+        arena = ASTArena()
+        imported = arena.view(arena.import_scope(copy))
+        for scope in (copy, imported):
+            self.assertEqual(scope.line, 2)
+            levels = 0
+            block = scope.get_block()
+            while block.children[-1].data == "if":
+                block = block.children[-1].get_block()
+                levels += 1
+            self.assertEqual(levels, depth)
+            self.assertEqual(block.children[0].get_name().name, "f")
+
+
+class TestResolver(unittest.TestCase):
+    def test_regions_that_set_register_bits_need_the_measurement_qubit(self):
+        ast = build_ast(
+            """region A<3> { Q[] q = ^00^; C[] c = #01; }
+            region B<3> { Q[] q = ^00^; C[] c = #00; }"""
+        )
+        Resolver(ast).traverse()
+        self.assertTrue(ast.does_region_need_measurement_qubit("A"))
+        self.assertFalse(ast.does_region_need_measurement_qubit("B"))
+        self.assertTrue(State(ast).regions["A"][2])
+
+    def test_measurement_qubit_counts_towards_the_qubit_cap(self):
+        ast = build_ast("region A<2> { Q[] q = ^00^; C[] c = #1; }")
+        Resolver(ast).traverse()
+        with self.assertRaises(CompilerError) as e:
+            ErrorChecker(ast, State(ast)).traverse()
+        self.assertEqual(e.exception.error_code, "R1N")
+
 
 if __name__ == "__main__":
     unittest.main()
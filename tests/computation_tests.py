@@ -0,0 +1,109 @@
+import unittest
+from checker import ErrorChecker
+from computation import ComputationHandler
+from input_parser import build_ast
+from resolver import Resolver
+from state import State
+
+
+def analyse(contents, arena=False):
+    ast = build_ast(contents, arena=arena)
+    Resolver(ast).traverse()
+    state = State(ast)
+    ErrorChecker(ast, state).traverse()
+    ComputationHandler(ast).traverse()
+    return ast
+
+
+def call_arguments(block) -> list:
+    """Collect the constant arguments of every function call in a block, in order"""
+    values = []
+    for stmt in block.children:
+        if stmt.data == "function_call":
+            for arg in stmt.get_call_list().get_classical_arguments():
+                values.append(arg.value)
+        elif stmt.data == "if":
+            values += call_arguments(stmt.get_block())
+    return values
+
+
+class TestComputation(unittest.TestCase):
+    def test_constants_are_folded(self):
+        ast = analyse(
+            "region A<1> { Q[] q = ^0^; Const a = 2 * 3 + 1; Const b = a - 4 / 2; rz(b, q[0]); }"
+        )
+        self.assertEqual(call_arguments(ast.regions["A"][0].get_block()), [5])
+
+    def test_constants_are_folded_in_arena(self):
+        ast = analyse(
+            "region A<1> { Q[] q = ^0^; Const a = 2 * 3 + 1; Const b = a - 4 / 2; rz(b, q[0]); }",
+            arena=True,
+        )
+        self.assertEqual(call_arguments(ast.regions["A"][0].get_block()), [5])
+
+    def test_long_expressions_are_folded(self):
+        terms = " + ".join(["1"] * 5000)
+        ast = analyse(
+            "region A<1> { Q[] q = ^0^; Const a = " + terms + "; rz(a, q[0]); }"
+        )
+        self.assertEqual(call_arguments(ast.regions["A"][0].get_block()), [5000])
+
+    def test_inner_declarations_shadow_outer_ones(self):
+        ast = analyse(
+            """region A<1> {
+                Q[] q = ^0^;
+                Const a = 1;
+                if a == 1 { Const a = 2; rz(a, q[0]); }
+                rz(a, q[0]);
+            }"""
+        )
+        self.assertEqual(call_arguments(ast.regions["A"][0].get_block()), [2, 1])
+
+    def test_deeply_nested_blocks_resolve_outer_constants(self):
+        depth = 100
+        body = "if a == 1 { " * depth + "rz(a, q[0]);" + " }" * depth
+        ast = analyse("region A<1> { Q[] q = ^0^; Const a = 1; " + body + " }")
+        self.assertEqual(call_arguments(ast.regions["A"][0].get_block()), [1])
+
+    def test_folding_rewrites_nodes_in_place(self):
+        ast = build_ast("region A<1> { Q[] q = ^0^; Const a = 2; rz(a, q[0]); }")
+        block = ast.top_level_scope.children[0].get_block()
+        call_list = block.children[2].get_call_list()
+        argument = call_list.children[0]
+        Resolver(ast).traverse()
+        ErrorChecker(ast, State(ast)).traverse()
+        ComputationHandler(ast).traverse()
+        self.assertIs(call_list.children[0], argument)
+        self.assertEqual((argument.data, argument.value), ("uint", 2))
+        self.assertEqual(argument.children, [])
+        # The declaration of the constant is removed from the list the block already holds
+        self.assertIs(block.children, block.sub_scopes)
+        self.assertEqual([s.data for s in block.children], ["q_decl", "function_call"])
+
+    def test_folded_operations_are_counted_per_region(self):
+        ast = build_ast(
+            """region A<1> {
+                Q[] q = ^0^;
+                Const n = 3;
+                Const a = n * 2 + 1;
+                Const b = n * 2 + 1;
+                Const c = n * 2;
+                Const d = a + b + c;
+                rz(d, q[0]);
+            }
+            region B<1> { Q[] q = ^0^; Const m = 1 + 1; rz(m, q[0]); }"""
+        )
+        Resolver(ast).traverse()
+        ErrorChecker(ast, State(ast)).traverse()
+        handler = ComputationHandler(ast)
+        handler.traverse()
+        self.assertEqual(call_arguments(ast.regions["A"][0].get_block()), [20])
+        self.assertEqual(handler.folder.stats, {"A": 7, "B": 1})
+        self.assertEqual(
+            handler.folder.report(),
+            "Constant folding in region 'A': 7 operations folded\n"
+            "Constant folding in region 'B': 1 operations folded",
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from ast_builder import ASTBuilder
+from incremental import IncrementalParser, split_top_level
+from input_parser import parse
+from tests.parser_tests import flatten
+
+
+def build(contents):
+    builder = ASTBuilder(parse(contents))
+    builder.traverse()
+    return builder.ast.top_level_scope
+
+
+class TestIncrementalParser(unittest.TestCase):
+    def setUp(self) -> None:
+        self.contents_for_test = """// A test program
+region A<5> {
+  Q[] q = ^000^;
+  hadamard(q[0:2]);
+}
+
+region B<5> { Q[] q = ^00^; } func F(x: Q) {
+  // A comment with a brace }
+  not(x);
+}
+region C<5> {
+  Q[] q = ^0^;
+  F(q[0]);
+}
+"""
+
+    def test_split_top_level(self):
+        chunks = split_top_level(self.contents_for_test)
+        self.assertEqual([line for line, _ in chunks], [1, 6, 11])
+        self.assertEqual("".join(text for _, text in chunks), self.contents_for_test)
+
+    def test_incremental_ast_matches_full_build(self):
+        parser = IncrementalParser()
+        ast = parser.parse(self.contents_for_test)
+        self.assertEqual(parser.chunks_parsed, 3)
+        self.assertEqual(
+            flatten(ast.top_level_scope), flatten(build(self.contents_for_test))
+        )
+
+    def test_only_changed_chunks_are_parsed(self):
+        parser = IncrementalParser()
+        parser.parse(self.contents_for_test)
+        changed = self.contents_for_test.replace(
+            "hadamard(q[0:2]);", "hadamard(q[0:2]);\n  not(q[1]);"
+        )
+        ast = parser.parse(changed)
+        self.assertEqual(parser.chunks_parsed, 1)
+        self.assertEqual(flatten(ast.top_level_scope), flatten(build(changed)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from inliner import Inliner
+from input_parser import build_ast
+from output import Output
+from parallel import compile_regions
+from resolver import Resolver
+from state import State
+from tests.pipeline import transpile
+
+
+def inline(contents, level):
+    transpiler = transpile(contents)
+    inliner = Inliner(transpiler.gates, level)
+    inliner.inline_gates()
+    for program in transpiler.programs.values():
+        inliner.inline_program(program)
+    return transpiler, inliner
+
+
+def body(code):
+    """Returns the lines of a region's code after the header"""
+    return code.split("\n")[4:-1]
+
+
+class TestInliner(unittest.TestCase):
+    def test_cost_model(self):
+        contents = """region A<4> {
+                Q[] q = ^000^;
+                Small(q[0]);
+                Small(q[1]);
+                Large(q[0], q[1]);
+                Large(q[1], q[2]);
+                Large(q[2], q[0]);
+                Once(q[2]);
+            }
+            func Small(x: Q) { hadamard(x); }
+            func Large(x: Q, y: Q) { hadamard(x); cx(x, y); hadamard(y); cx(y, x); }
+            func Once(x: Q) { hadamard(x); not(x); y(x); }"""
+        transpiler, inliner = inline(contents, 1)
+        self.assertEqual(inliner.inlined, {"small": 2, "once": 1})
+        self.assertEqual(transpiler.programs["A"].dependencies, {"large"})
+        # The larger shared function is inlined once the output may grow
+        transpiler, inliner = inline(contents, 2)
+        self.assertEqual(inliner.inlined, {"small": 2, "large": 3, "once": 1})
+        self.assertEqual(transpiler.programs["A"].dependencies, set())
+        transpiler, inliner = inline(contents, 0)
+        self.assertEqual(inliner.inlined, {})
+
+    def test_repeated_calls_and_conditions(self):
+        transpiler, _ = inline(
+            """region A<6> {
+                Q[] q = ^000^;
+                Q[] m = ^0^;
+                C[] c = #0;
+                c[0:] <- m[0:0];
+                if c == 1 { F(4, q[0:2], q[0]); }
+            }
+            func F(a: Const, x: Q, y: Q) { G(x); rz(a, y); }
+            func G(x: Q) { hadamard(x); }""",
+            2,
+        )
+        files = Output.generate_output(transpiler.programs, transpiler.gates)
+        self.assertEqual(
+            body(files[0][1]),
+            [
+                "qreg q[3];",
+                "qreg m[1];",
+                "creg c[1];",
+                "measure m -> c;",
+                "if (c==1) h q[0];",
+                "if (c==1) rz(4) q[0];",
+                "if (c==1) h q[1];",
+                "if (c==1) rz(4) q[0];",
+                "if (c==1) h q[2];",
+                "if (c==1) rz(4) q[0];",
+            ],
+        )
+
+    def test_functions_inlined_into_functions(self):
+        transpiler, inliner = inline(
+            """region A<4> {
+                Q[] q = ^000^;
+                F(q[0], q[1]); F(q[1], q[2]); F(q[2], q[0]); F(q[0], q[2]);
+            }
+            func F(x: Q, y: Q) { G(x, y); hadamard(y); cx(y, x); G(y, x); }
+            func G(x: Q, y: Q) { cx(x, y); }""",
+            1,
+        )
+        self.assertEqual(inliner.inlined, {"g": 2})
+        self.assertEqual(transpiler.programs["A"].dependencies, {"f"})
+        self.assertEqual(
+            transpiler.gates["f"].emit(),
+            "gate f () x,y{\n  cx x, y;\n  h y;\n  cx y, x;\n  cx y, x;\n}",
+        )
+
+    def test_parallel_compilation(self):
+        contents = "".join(
+            "region R%d<4> { Q[] q = ^000^; F(q[0:2], q[0]); }" % i for i in range(4)
+        ) + "func F(x: Q, y: Q) { hadamard(x); cx(x, y); }"
+        transpiler, _ = inline(contents, 2)
+        expected = Output.generate_output(transpiler.programs, transpiler.gates)
+        for jobs in (1, 2):
+            ast = build_ast(contents)
+            Resolver(ast).traverse()
+            programs, gates, _ = compile_regions(
+                ast, State(ast), jobs=jobs, inline_level=2
+            )
+            self.assertEqual(Output.generate_output(programs, gates), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
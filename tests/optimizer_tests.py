@@ -0,0 +1,88 @@
+import unittest
+from optimizer import PeepholeOptimizer
+from tests.pipeline import transpile
+
+
+def optimize(statements, level, declarations="Q[] q = ^000^; Q[] r = ^00^;"):
+    """Optimizes the statements of a region, returning its code and the optimizer"""
+    transpiler = transpile("region A<10> { %s %s }" % (declarations, statements))
+    optimizer = PeepholeOptimizer(level)
+    optimizer.optimize_program(transpiler.programs["A"])
+    lines = transpiler.programs["A"].emit().split("\n")[:-1]
+    return [line for line in lines if not line.startswith("qreg")], optimizer
+
+
+class TestPeepholeOptimizer(unittest.TestCase):
+    def test_levels(self):
+        statements = (
+            "hadamard(q[0]); not(q[1]); hadamard(q[0]); rz(1, q[2]); rz(2, q[2]);"
+        )
+        code, _ = optimize(statements, 0)
+        self.assertEqual(len(code), 5)
+        code, optimizer = optimize(statements, 1)
+        self.assertEqual(code, ["h q[0];", "x q[1];", "h q[0];", "rz(3) q[2];"])
+        self.assertEqual(optimizer.merged, 1)
+        code, optimizer = optimize(statements, 2)
+        self.assertEqual(code, ["x q[1];", "rz(3) q[2];"])
+        self.assertEqual(optimizer.cancelled, 1)
+
+    def test_cancelled_pairs_cascade_at_level_1(self):
+        code, optimizer = optimize(
+            "hadamard(q[0]); hadamard(q[0]); hadamard(q[0]); hadamard(q[0]);"
+            "rz(1, q[1]); not(q[1]); not(q[1]); rz(2, q[1]); not(q[2]); hadamard(q[0]);"
+            "not(q[2]);",
+            1,
+        )
+        # The outer pairs only follow each other once the inner pairs are cancelled
+        self.assertEqual(code, ["rz(3) q[1];", "x q[2];", "h q[0];", "x q[2];"])
+        self.assertEqual((optimizer.cancelled, optimizer.merged), (3, 1))
+
+    def test_nested_pairs_and_identities(self):
+        code, optimizer = optimize(
+            "cx(q[0], q[1]); hadamard(q[1]); rz(0, q[1]); not(q[1]); not(q[1]);"
+            "hadamard(q[1]); cx(q[0], q[1]); ry(2, q[2]); ry(0, q[2]); cx(q[1], q[0]);",
+            1,
+        )
+        self.assertEqual(code, ["ry(2) q[2];", "cx q[1], q[0];"])
+        self.assertEqual(
+            optimizer.report(),
+            "Peephole optimization: 3 self-inverse pairs cancelled, 0 rotations merged, "
+            "2 identity rotations removed",
+        )
+
+    def test_whole_registers_and_slices(self):
+        code, _ = optimize(
+            "hadamard(q[0:2]); hadamard(q[0:2]); hadamard(q[0:1]); hadamard(q[0:1]);"
+            "cx(q[0], r[0:1]); cx(q[0], r[0:1]); swap(q[0], r[0:0]); swap(q[0], r[0:0]);",
+            2,
+        )
+        # Gates on several qubits are only cancelled when they are not repeated
+        self.assertEqual(code, ["cx q[0], r;", "cx q[0], r;"])
+
+    def test_conditions_and_measurements(self):
+        code, _ = optimize(
+            """if c == 1 { not(r[0]); } not(r[0]);
+            if c == 1 { not(r[1]); } if c == 1 { not(r[1]); }
+            if c == 0 { not(q[2]); } d[0:] <- s[0:0]; if c == 0 { not(q[2]); }
+            if d == 0 { not(q[2]); } d[0:] <- t[0:0]; if d == 0 { not(q[2]); }""",
+            2,
+            declarations="Q[] q = ^000^; Q[] r = ^00^; Q[] s = ^0^; Q[] t = ^0^;"
+            "C[] c = #0; C[] d = #0;",
+        )
+        self.assertEqual(
+            code,
+            [
+                "creg c[1];",
+                "creg d[1];",
+                "if (c==1) x r[0];",
+                "x r[0];",
+                "measure s -> d;",
+                "if (d==0) x q[2];",
+                "measure t -> d;",
+                "if (d==0) x q[2];",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
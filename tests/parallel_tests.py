@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+from errors import CompilerError
+from input_parser import build_ast
+from output import Output
+from parallel import compile_regions
+from resolver import Resolver
+from state import State
+from tests.pipeline import transpile
+
+
+def resolve(contents):
+    ast = build_ast(contents)
+    Resolver(ast).traverse()
+    return ast, State(ast)
+
+
+def compile_sequentially(contents):
+    transpiler = transpile(contents)
+    return Output.generate_output(transpiler.programs, transpiler.gates)
+
+
+class TestParallelCompilation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.contents_for_test = "".join(
+            """region R%d<4> {
+                Q[] q = ^000^;
+                Const a = %d;
+                if a > 4 { H(q[0], q[1]); }
+                rz(a, q[2]);
+                C[] c = #010;
+                c[0:] <- q[0:2];
+            }
+            """
+            % (i, i)
+            for i in range(10)
+        ) + "func H(x: Q, y: Q) { hadamard(x); cx(x, y); }"
+
+    def test_output_matches_sequential_compilation(self):
+        expected = compile_sequentially(self.contents_for_test)
+        for jobs in (1, 3):
+            ast, state = resolve(self.contents_for_test)
+            programs, gates, _ = compile_regions(ast, state, jobs=jobs)
+            self.assertEqual(Output.generate_output(programs, gates), expected)
+
+    def test_first_error_is_raised(self):
+        contents = (
+            "region A<1> { Q[] q = ^0^; hadamard(q[0]); }"
+            "region B<1> { Q[] q = ^0^; hadamard(q[3]); }"
+            "region C<1> { Q[] q = ^00^; }"
+        )
+        ast, state = resolve(contents)
+        with self.assertRaises(CompilerError) as e:
+            compile_regions(ast, state, jobs=2)
+        self.assertEqual(e.exception.error_code, "Q3")
+
+    def test_error_matches_sequential_compilation(self):
+        programs = [
+            # The sequential compiler checks the whole file before folding any constants
+            "region A<1> { Q[] q = ^0^; Const a = q + 1; }"
+            "region B<1> { Q[] q = ^0^; hadamard(q[3]); }",
+            # Functions are not checked before the regions declared above them
+            "region A<1> { Q[] q = ^00^; } func F(x: Q) { Const b = 1; }",
+        ]
+        for contents in programs:
+            with self.subTest(contents=contents):
+                with self.assertRaises(CompilerError) as e:
+                    compile_sequentially(contents)
+                error = e.exception
+                expected = (error.error_code, error.line, error.column)
+                for jobs in (1, 2):
+                    ast, state = resolve(contents)
+                    with self.assertRaises(CompilerError) as e:
+                        compile_regions(ast, state, jobs=jobs)
+                    error = e.exception
+                    self.assertEqual(
+                        (error.error_code, error.line, error.column), expected
+                    )
+
+    def test_sequential_fallback_is_reported(self):
+        ast, state = resolve(self.contents_for_test)
+        with mock.patch(
+            "multiprocessing.get_all_start_methods", return_value=["spawn"]
+        ):
+            _, _, reports = compile_regions(ast, state, jobs=2)
+        self.assertIn(
+            "Parallel compilation: processes cannot be forked on this platform, so "
+            "the regions were compiled one after the other",
+            reports,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
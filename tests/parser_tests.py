@@ -0,0 +1,211 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import input_parser
+from lark import Lark
+from ast_builder import ASTBuilder
+from input_parser import build_ast, parse, parse_file, parse_stream
+from payloads import payload_fields
+
+
+def flatten(scope) -> list:
+    """Flatten an AST into a list of (type, line, column, data) tuples."""
+    p = {}
+    if scope.payload is not None:
+        p = {
+            f: getattr(scope.payload, f)
+            for f in payload_fields(scope.payload)
+            if f != "owning_scope"
+        }
+    nodes = [(scope.data, scope.line, scope.column, p)]
+    for child in scope.children:
+        nodes += flatten(child)
+    return nodes
+
+
+def build(contents, mode):
+    builder = ASTBuilder(parse(contents, mode=mode))
+    builder.traverse()
+    return builder.ast.top_level_scope
+
+
+class TestParserModes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.contents_for_test = """
+        region Test<10> {
+            Q[] q1 = ^000^;
+            C[] c = #010;
+            Const a = 1 + 2 * 3 - 4 / 2;
+            if a != 2 {
+                f(a, q1[0], q1[1:2]);
+            }
+            c[0:] <- q1[0:2];
+        }
+        func F(c: Const, x: Q, y: Q) {
+            rz(c, x);
+            cx(x, y);
+        }
+        """
+
+    def test_lalr_and_earley_build_same_ast(self):
+        lalr = flatten(build(self.contents_for_test, "lalr"))
+        earley = flatten(build(self.contents_for_test, "earley"))
+        self.assertEqual(lalr, earley)
+
+    def test_direct_ast_matches_built_ast(self):
+        direct = flatten(build_ast(self.contents_for_test).top_level_scope)
+        built = flatten(build(self.contents_for_test, "lalr"))
+        self.assertEqual(direct, built)
+
+    def test_arena_ast_matches_built_ast(self):
+        arena = flatten(build_ast(self.contents_for_test, arena=True).top_level_scope)
+        built = flatten(build(self.contents_for_test, "lalr"))
+        self.assertEqual(arena, built)
+
+    def test_arena_fields_and_getters_check_the_node_kind(self):
+        ast = build_ast(self.contents_for_test, arena=True)
+        region = ast.top_level_scope.children[0]
+        arena = region.arena
+        payload_for = arena.payload_for
+        # The getters and data attributes read the arena itself
+        arena.payload_for = None
+        try:
+            block = region.get_block()
+            declaration = block.children[0]
+            self.assertEqual(region.get_name().name, "Test")
+            self.assertEqual(region.get_qubit_cap(), 10)
+            self.assertEqual(declaration.get_name().name, "q1")
+            self.assertEqual(declaration.get_length(), 3)
+            self.assertEqual(block.children[2].get_expression().operation, "sub")
+            for attribute in ("name", "value", "operation", "is_empty", "symbol"):
+                with self.assertRaises(AttributeError):
+                    getattr(block, attribute)
+            with self.assertRaises(AttributeError):
+                declaration.get_qubit_cap()
+        finally:
+            arena.payload_for = payload_for
+
+    def test_arena_children_are_changed_through_the_arena(self):
+        ast = build_ast(self.contents_for_test, arena=True)
+        region = ast.top_level_scope.children[0]
+        block = region.get_block()
+        count = len(block.children)
+        # Changing the children in place would not change the arena
+        with self.assertRaises(AttributeError):
+            block.sub_scopes.append(block.children[0])
+        with self.assertRaises(TypeError):
+            block.children[0] = block.children[1]
+        block.children = block.children[1:]
+        self.assertEqual(len(block.children), count - 1)
+        adopted = block.adopt_sub_scope(build_ast("region B<1> { }").top_level_scope)
+        self.assertEqual(len(block.children), count)
+        self.assertEqual(block.children[-1].index, adopted.index)
+        self.assertEqual(adopted.super_scope.index, block.index)
+
+    def test_auto_uses_lalr(self):
+        tree = parse(self.contents_for_test, mode="auto")
+        self.assertEqual(tree, parse(self.contents_for_test, mode="lalr"))
+
+
+class TestParserInput(unittest.TestCase):
+    def setUp(self) -> None:
+        self.contents_for_test = "region A<1> {\n  Q[] q = ^0^;\n\n  not(q[0]);\n}\n"
+
+    def test_native_line_numbers(self):
+        region = build(self.contents_for_test, "lalr").children[0]
+        statements = region.get_block().children
+        self.assertEqual([s.line for s in statements], [2, 4])
+
+    def test_file_and_stream_input_match(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".funq", delete=False) as f:
+            f.write(self.contents_for_test)
+        try:
+            from_file = parse_file(f.name)
+        finally:
+            os.remove(f.name)
+        from_text = parse_stream(io.StringIO(self.contents_for_test))
+        from_bytes = parse_stream(io.BytesIO(self.contents_for_test.encode("utf-8")))
+        self.assertEqual(from_file, from_text)
+        self.assertEqual(from_file, from_bytes)
+
+
+class TestParserCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.old_cache_dir = input_parser.PARSER_CACHE_DIR
+        input_parser.PARSER_CACHE_DIR = self.cache_dir.name
+
+    def tearDown(self) -> None:
+        input_parser.PARSER_CACHE_DIR = self.old_cache_dir
+        self.cache_dir.cleanup()
+
+    def test_parser_is_loaded_from_cache(self):
+        contents = "region Test<5> { Q[] q1 = ^000^; hadamard(q1[0:2]); }"
+        built = input_parser.build_parser("lalr")
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
+        loaded = input_parser.build_parser("lalr")
+        self.assertEqual(built.parse(contents), loaded.parse(contents))
+        self.assertEqual(
+            built.parse(contents).children[0].meta.column,
+            loaded.parse(contents).children[0].meta.column,
+        )
+
+    def test_second_build_is_loaded_from_the_cache_file(self):
+        input_parser.build_parser("lalr")
+        with mock.patch.object(Lark, "__init__", side_effect=AssertionError("rebuilt")):
+            input_parser.build_parser("lalr")
+
+    def test_cache_folder_is_private(self):
+        input_parser.PARSER_CACHE_DIR = os.path.join(self.cache_dir.name, "funq")
+        input_parser.build_parser("lalr")
+        mode = os.stat(input_parser.PARSER_CACHE_DIR).st_mode
+        self.assertEqual(mode & 0o777, 0o700)
+
+    def test_cache_writable_by_others_is_not_used(self):
+        os.chmod(self.cache_dir.name, 0o777)
+        input_parser.build_parser("lalr")
+        self.assertEqual(os.listdir(self.cache_dir.name), [])
+
+    def test_cache_file_writable_by_others_is_not_loaded(self):
+        input_parser.build_parser("lalr")
+        (name,) = os.listdir(self.cache_dir.name)
+        os.chmod(os.path.join(self.cache_dir.name, name), 0o666)
+        with mock.patch.object(Lark, "__init__", side_effect=AssertionError("rebuilt")):
+            self.assertRaises(AssertionError, input_parser.build_parser, "lalr")
+
+    def test_transformers_are_attached_when_loading(self):
+        contents = "region Test<5> { Q[] q1 = ^000^; hadamard(q1[0:2]); }"
+        old_parsers = dict(input_parser.PARSERS)
+        input_parser.PARSERS.clear()
+        try:
+            built = flatten(build_ast(contents).top_level_scope)
+            # The direct and arena parsers share one cache file, without a transformer
+            (name,) = os.listdir(self.cache_dir.name)
+            with open(os.path.join(self.cache_dir.name, name), "rb") as f:
+                self.assertIsNone(Lark.load(f).options.transformer)
+            input_parser.PARSERS.clear()
+            rebuilt = AssertionError("rebuilt")
+            with mock.patch.object(Lark, "__init__", side_effect=rebuilt):
+                loaded = flatten(build_ast(contents).top_level_scope)
+                arena = flatten(build_ast(contents, arena=True).top_level_scope)
+        finally:
+            input_parser.PARSERS.clear()
+            input_parser.PARSERS.update(old_parsers)
+        self.assertEqual(loaded, built)
+        self.assertEqual(arena, built)
+
+    def test_broken_cache_file_is_rebuilt(self):
+        input_parser.build_parser("lalr")
+        (name,) = os.listdir(self.cache_dir.name)
+        with open(os.path.join(self.cache_dir.name, name), "wb") as f:
+            f.write(b"broken")
+        contents = "region Test<5> { Q[] q1 = ^000^; }"
+        self.assertEqual(
+            input_parser.build_parser("lalr").parse(contents), parse(contents)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
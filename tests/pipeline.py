@@ -0,0 +1,20 @@
+from checker import ErrorChecker
+from computation import ComputationHandler
+from input_parser import build_ast
+from pruner import BranchPruner
+from resolver import Resolver
+from state import State
+from transpiler import DEFAULT_CLASSICAL_INITIALIZATION, Transpiler
+
+
+def transpile(contents, creg_initialization=DEFAULT_CLASSICAL_INITIALIZATION):
+    """Compiles a program with the default passes, and returns the Transpiler holding its code"""
+    ast = build_ast(contents)
+    Resolver(ast).traverse()
+    state = State(ast)
+    ErrorChecker(ast, state).traverse()
+    ComputationHandler(ast).traverse()
+    BranchPruner(ast, state).traverse()
+    transpiler = Transpiler(state, creg_initialization)
+    transpiler.transpile()
+    return transpiler
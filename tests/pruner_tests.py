@@ -0,0 +1,62 @@
+import unittest
+from checker import ErrorChecker
+from computation import ComputationHandler
+from input_parser import build_ast
+from output import Output
+from pruner import BranchPruner
+from resolver import Resolver
+from state import State
+from transpiler import Transpiler
+
+
+def compile_pruned(contents, arena=False):
+    ast = build_ast(contents, arena=arena)
+    Resolver(ast).traverse()
+    state = State(ast)
+    ErrorChecker(ast, state).traverse()
+    ComputationHandler(ast).traverse()
+    BranchPruner(ast, state).traverse()
+    return ast, state
+
+
+class TestBranchPruner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.contents_for_test = """
+        region A<2> {
+            Q[] q = ^00^;
+            Const a = 1;
+            if a == 0 { F(q[0]); }
+            if a == 1 {
+                hadamard(q[0]);
+                if a > 2 { G(q[1]); }
+            }
+            C[] c = #00;
+            if c == 1 { not(q[1]); }
+            c[0:] <- q[0:1];
+        }
+        func F(x: Q) { hadamard(x); }
+        func G(x: Q) { hadamard(x); }
+        """
+
+    def test_constant_branches_are_pruned(self):
+        for arena in (False, True):
+            ast, _ = compile_pruned(self.contents_for_test, arena=arena)
+            block = ast.regions["A"][0].get_block()
+            self.assertEqual(
+                [s.data for s in block.children],
+                ["q_decl", "function_call", "c_decl", "if", "measurement"],
+            )
+            self.assertEqual(block.children[1].get_name().name, "hadamard")
+
+    def test_functions_called_from_removed_branches_are_not_emitted(self):
+        _, state = compile_pruned(self.contents_for_test)
+        self.assertEqual(state.regions["A"][3], set())
+        transpiler = Transpiler(state)
+        transpiler.transpile()
+        code = Output.generate_output(transpiler.programs, transpiler.gates)[0][1]
+        self.assertNotIn("gate", code)
+        self.assertIn("if (c==1) x q[1];", code)
+
+
+if __name__ == "__main__":
+    unittest.main()
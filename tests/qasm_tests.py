@@ -0,0 +1,237 @@
+import unittest
+from checker import ErrorChecker
+from computation import ComputationHandler
+from input_parser import build_ast
+from output import Output
+from qasm import C_REG, UINT
+from resolver import Resolver
+from state import State
+from tests.pipeline import transpile
+from transpiler import Transpiler
+
+
+class TestInstructionList(unittest.TestCase):
+    def test_names_are_interned(self):
+        transpiler = transpile(
+            """region A<3> {
+                Q[] q = ^01^;
+                hadamard(q[0]); hadamard(q[1]); not(q[0]);
+            }"""
+        )
+        instructions = transpiler.programs["A"].instructions
+        # qreg q[2]; x q[1]; h q[0]; h q[1]; x q[0];
+        self.assertEqual(len(instructions), 5)
+        self.assertEqual(sorted(instructions.names), ["h", "q", "x"])
+        self.assertEqual(instructions.opcodes.itemsize, 1)
+
+    def test_nested_conditions(self):
+        transpiler = transpile(
+            """region A<6> {
+                Q[] q = ^00^;
+                Q[] m = ^00^;
+                C[] c = #00;
+                c[0:] <- m[0:1];
+                if c == 1 {
+                    hadamard(q[0]);
+                    if 2 > 1 { if c != 2 { not(q[1]); } }
+                    if 1 > 2 { not(q[0]); }
+                    rz(3, q[0:1]);
+                }
+            }"""
+        )
+        instructions = transpiler.programs["A"].instructions
+        outer = (("==", (C_REG, "c"), (UINT, 1)),)
+        inner = outer + (("!=", (C_REG, "c"), (UINT, 2)),)
+        self.assertEqual(instructions.condition_table, [(), outer, inner])
+        self.assertEqual(list(instructions.conditions), [0, 0, 0, 0, 1, 2, 1])
+        self.assertEqual(
+            transpiler.programs["A"].emit(),
+            "qreg q[2];\n"
+            "qreg m[2];\n"
+            "creg c[2];\n"
+            "measure m -> c;\n"
+            "if (c==1) h q[0];\n"
+            "if (c==1) if (c!=2) x q[1];\n"
+            "if (c==1) rz(3) q;\n",
+        )
+
+    def test_big_constants(self):
+        transpiler = transpile(
+            """region A<2> {
+                Q[] q = ^0^;
+                Const a = 99999999999999999999;
+                rz(a, q[0]);
+                if a > 1 { hadamard(q[0]); }
+            }"""
+        )
+        self.assertEqual(
+            transpiler.programs["A"].emit(),
+            "qreg q[1];\nrz(99999999999999999999) q[0];\nh q[0];\n",
+        )
+
+    def test_register_broadcast(self):
+        transpiler = transpile(
+            """region A<12> {
+                Q[] q = ^000^;
+                Q[] r = ^000^;
+                Q[] s = ^00^;
+                C[] c = #000;
+                C[] d = #0000;
+                C[] e = #00;
+                cx(q[0], r[0:2]);
+                hadamard(q[1:2]);
+                c[0:] <- q[0:2];
+                d[0:] <- r[0:2];
+                e[1:] <- s[0:0];
+            }"""
+        )
+        self.assertEqual(
+            transpiler.programs["A"].emit(),
+            "qreg q[3];\n"
+            "qreg r[3];\n"
+            "qreg s[2];\n"
+            "creg c[3];\n"
+            "creg d[4];\n"
+            "creg e[2];\n"
+            "cx q[0], r;\n"
+            "h q[1];\n"
+            "h q[2];\n"
+            "measure q -> c;\n"
+            "measure r[0] -> d[0];\n"
+            "measure r[1] -> d[1];\n"
+            "measure r[2] -> d[2];\n"
+            "measure s[0] -> e[1];\n",
+        )
+
+    def test_constant_depth_classical_initialization(self):
+        contents = """region A<%d> {
+                Q[] q = ^00^;
+                C[] c = #1011;
+                C[] d = #11;
+                C[] e = #000;
+                if 1 > 0 { C[] f = #1111; }
+            }"""
+        transpiler = transpile(contents % 12, "depth")
+        self.assertFalse(transpiler.programs["A"].measurement_qubit_needed)
+        self.assertEqual(
+            transpiler.programs["A"].emit(),
+            "qreg creginit[4];\n"
+            "qreg q[2];\n"
+            "creg c[4];\n"
+            "x creginit[0];\n"
+            "x creginit[1];\n"
+            "x creginit[2];\n"
+            "measure creginit[0] -> c[0];\n"
+            "measure creginit[1] -> c[2];\n"
+            "measure creginit[2] -> c[3];\n"
+            "reset creginit[0];\n"
+            "reset creginit[1];\n"
+            "reset creginit[2];\n"
+            "creg d[2];\n"
+            "x creginit[0];\n"
+            "x creginit[1];\n"
+            "measure creginit[0] -> d[0];\n"
+            "measure creginit[1] -> d[1];\n"
+            "reset creginit[0];\n"
+            "reset creginit[1];\n"
+            "creg e[3];\n"
+            "creg f[4];\n"
+            "x creginit;\n"
+            "measure creginit -> f;\n"
+            "reset creginit;\n",
+        )
+        # Without enough qubits to spare, the bits are set a few at a time
+        code = transpile(contents % 5, "depth").programs["A"].emit().split("\n")
+        self.assertEqual(code[0], "qreg creginit[3];")
+        self.assertEqual(
+            code[code.index("creg f[4];") :],
+            [
+                "creg f[4];",
+                "x creginit[0];",
+                "x creginit[1];",
+                "x creginit[2];",
+                "measure creginit[0] -> f[0];",
+                "measure creginit[1] -> f[1];",
+                "measure creginit[2] -> f[2];",
+                "reset creginit;",
+                "x creginit[0];",
+                "measure creginit[0] -> f[3];",
+                "reset creginit[0];",
+                "",
+            ],
+        )
+        # With a single qubit to spare, the measurement qubit is used
+        transpiler = transpile(contents % 3, "depth")
+        self.assertTrue(transpiler.programs["A"].measurement_qubit_needed)
+        self.assertEqual(
+            transpiler.programs["A"].emit(),
+            transpile(contents % 3).programs["A"].emit(),
+        )
+
+    def test_initialization_register_is_sized_by_the_ones(self):
+        transpiler = transpile(
+            """region A<20> {
+                C[] c = #1000000000000000;
+                C[] d = #0100000100000000;
+            }""",
+            "depth",
+        )
+        self.assertEqual(
+            transpiler.programs["A"].emit(),
+            "qreg creginit[2];\n"
+            "creg c[16];\n"
+            "x creginit[0];\n"
+            "measure creginit[0] -> c[0];\n"
+            "reset creginit[0];\n"
+            "creg d[16];\n"
+            "x creginit[0];\n"
+            "x creginit[1];\n"
+            "measure creginit[0] -> d[1];\n"
+            "measure creginit[1] -> d[7];\n"
+            "reset creginit;\n",
+        )
+
+    def test_constant_conditions_without_the_branch_pruner(self):
+        ast = build_ast(
+            """region A<2> {
+                Q[] q = ^00^;
+                if 1 > 0 { hadamard(q[0]); }
+                if 1 < 0 { hadamard(q[1]); }
+            }"""
+        )
+        Resolver(ast).traverse()
+        state = State(ast)
+        ErrorChecker(ast, state).traverse()
+        ComputationHandler(ast).traverse()
+        transpiler = Transpiler(state)
+        transpiler.transpile()
+        self.assertEqual(transpiler.programs["A"].emit(), "qreg q[2];\nh q[0];\n")
+
+
+class RecordingSink:
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, text):
+        self.pieces.append(text)
+
+
+class TestStreamingOutput(unittest.TestCase):
+    def test_streamed_code_matches_generated_code(self):
+        with open("test.funq") as f:
+            transpiler = transpile(f.read())
+        generated = Output.generate_output(transpiler.programs, transpiler.gates)
+        streamed = Output.stream_output(transpiler.programs, transpiler.gates)
+        self.assertEqual(
+            [name for name, _ in streamed], [name for name, _ in generated]
+        )
+        for (name, write), (_, code) in zip(streamed, generated):
+            sink = RecordingSink()
+            write(sink)
+            self.assertEqual("".join(sink.pieces), code)
+            # The code is written in pieces, rather than built up and written at once
+            self.assertGreater(len(sink.pieces), code.count(";\n") // 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
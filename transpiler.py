@@ -1,45 +1,64 @@
+from io import StringIO
+from computation import COMPARISONS
 from qasm import (
-    CRegArgument,
-    ClassicalInitialization,
-    Comparison,
-    FunctionCall,
-    IfInstruction,
-    MeasurementInstruction,
-    QuantumIndexArgument,
-    QuantumInitialization,
-    QuantumRegArgument,
-    QuantumSliceArgument,
-    UIntArgument,
+    C_REG,
+    GATE,
+    MEASURE,
+    MEASURE_REGISTER,
+    QREG,
+    Q_INDEX,
+    Q_REG,
+    Q_SLICE,
+    UINT,
+    InstructionList,
+    classical_initialization,
+    constant_depth_classical_initialization,
+    emit_instructions,
+    quantum_initialization,
+    uint_argument,
 )
-from scope import MEASUREMENT_QUBIT_NAME, Scope
+from scope import INITIALIZATION_REGISTER_NAME, MEASUREMENT_QUBIT_NAME, Scope
 from standard_library import StandardLibrary
 from state import State
 
+# The strategies for initializing classical registers from literals. 'width' sets one bit at a
+# time with the measurement qubit, and 'depth' sets every bit at once with the initialization
+# register.
+CLASSICAL_INITIALIZATIONS = ["width", "depth"]
+DEFAULT_CLASSICAL_INITIALIZATION = "width"
 
 # A Transpiler converts an AST into OpenQASM programs by visiting the nodes
 # and converting.
 class Transpiler:
-    def __init__(self, state: State):
+    def __init__(
+        self, state: State, creg_initialization=DEFAULT_CLASSICAL_INITIALIZATION
+    ):
         self.regions = state.regions
         self.functions = state.functions
         self.programs = {}
         self.gates = {}
+        self.creg_initialization = creg_initialization
+        # The size of the initialization register of the program being generated, or 0 if
+        # classical registers are initialized with the measurement qubit
+        self.helper_size = 0
 
     def transpile(self):
+        self.transpile_functions()
+        for name in self.regions.keys():
+            self.transpile_region(name)
+
+    def transpile_functions(self):
         for name in self.functions.keys():
             f = self.functions[name]
             self.generate_gate(name, f[0], f[1], f[2])
-        for name in self.regions.keys():
-            r = self.regions[name]
-            self.generate_program(name, r[0], r[1], r[2], r[3])
 
-    def visit_region(self, region):
-        name = region.get_name().name
-        instructions = self.convert_to_instructions(region.get_block())
-        self.regions[name] = instructions
+    def transpile_region(self, name):
+        r = self.regions[name]
+        self.generate_program(name, r[0], r[1], r[2], r[3])
 
     def generate_gate(self, func_name, cargs, qargs, block):
-        instructions = self.convert_to_instructions(block)
+        instructions = InstructionList()
+        instructions.extend(self.lower(block))
         cargs = [c.get_name().name for c in cargs]
         qargs = [q.get_name().name for q in qargs]
         self.gates[func_name] = OpenQASMGate(func_name, cargs, qargs, instructions)
@@ -47,55 +66,110 @@ class Transpiler:
     def generate_program(
         self, name, qubits, block, measurement_qubit_needed, dependencies
     ):
-        instructions = self.convert_to_instructions(block)
+        instructions = InstructionList()
+        self.helper_size = 0
+        if measurement_qubit_needed and self.creg_initialization == "depth":
+            helper_size = self.initialization_register_size(qubits, block)
+            # With a single qubit to spare, the measurement qubit does the same
+            if helper_size > 1:
+                self.helper_size = helper_size
+                instructions.append(QREG, (INITIALIZATION_REGISTER_NAME, helper_size))
+                measurement_qubit_needed = False
+        instructions.extend(self.lower(block))
+        self.helper_size = 0
         self.programs[name] = OpenQASMProgram(
             qubits, instructions, dependencies, measurement_qubit_needed
         )
 
-    def convert_to_instructions(self, stmt: Scope) -> list:
-        if stmt.data == "block":
-            instructions = []
-            for s in stmt.children:
-                instructions += self.convert_to_instructions(s)
-            return instructions
-        elif stmt.data == "function_call":
-            cargs = [
-                self.convert_classical_arg(c)
-                for c in stmt.get_call_list().get_classical_arguments()
-            ]
-            qargs = [
-                self.convert_quantum_arg(q)
-                for q in stmt.get_call_list().get_quantum_arguments()
-            ]
-            # Is this in the standard library?
-            if StandardLibrary.is_standard(stmt.get_name().name):
-                return [
-                    FunctionCall(
-                        StandardLibrary.get_standard_name(stmt.get_name().name),
-                        cargs,
-                        qargs,
-                    )
-                ]
+    # The initialization register has a qubit for each one in the classical literal with the most
+    # ones, as long as the region has enough qubits left over for it. Registers declared in if
+    # statements are counted as if they were all declared at once.
+    @staticmethod
+    def initialization_register_size(qubits: int, block: Scope) -> int:
+        declared = 0
+        most_ones = 0
+        blocks = [block]
+        while blocks:
+            for stmt in blocks.pop().children:
+                if stmt.data == "if":
+                    blocks.append(stmt.get_block())
+                elif stmt.data == "q_decl":
+                    declared += stmt.get_length()
+                elif stmt.data == "c_decl":
+                    most_ones = max(most_ones, stmt.get_bits().count("1"))
+        return min(most_ones, qubits - declared)
+
+    # Lower a block into (opcode, operands, condition) triples, one statement at a time, so that a
+    # region's instructions are never held as a list of objects. The blocks of if statements are
+    # walked with an explicit stack of statement iterators, each with the condition its statements
+    # run under. The comparison of an if statement is added to the condition of the enclosing block.
+    # If statements whose conditions are known at compile time are normally removed by the
+    # BranchPruner first. Without it, the statements of a true one are lowered into the enclosing
+    # block, and a false one is skipped.
+    def lower(self, block: Scope):
+        stack = [(iter(block.children), ())]
+        while stack:
+            statements, condition = stack[-1]
+            stmt = next(statements, None)
+            if stmt is None:
+                stack.pop()
+            elif stmt.data == "if":
+                arg1, arg2 = stmt.get_args()
+                comparison = (
+                    stmt.get_op().get_operation(),
+                    self.lower_condition_arg(arg1),
+                    self.lower_condition_arg(arg2),
+                )
+                if comparison[1][0] == UINT and comparison[2][0] == UINT:
+                    operator, (_, value1), (_, value2) = comparison
+                    if COMPARISONS[operator](value1, value2):
+                        stack.append((iter(stmt.get_block().children), condition))
+                    continue
+                stack.append(
+                    (iter(stmt.get_block().children), condition + (comparison,))
+                )
             else:
-                return [FunctionCall(stmt.get_name().name, cargs, qargs)]
-        elif stmt.data == "if":
-            arg1, arg2 = stmt.get_args()
-            op = stmt.get_op().get_operation()
-            arg1 = self.convert_classical_arg(arg1)
-            arg2 = self.convert_classical_arg(arg2)
-            comp = Comparison(arg1, arg2, op)
-            sub_instructions = self.convert_to_instructions(stmt.get_block())
-            return [IfInstruction(comp, sub_instructions)]
-        elif stmt.data == "q_decl":
+                yield from self.lower_statement(stmt, condition)
+
+    def lower_statement(self, stmt: Scope, condition: tuple):
+        if stmt.data == "function_call":
             name = stmt.get_name().name
-            size = stmt.get_length()
-            bits = stmt.get_bits()
-            return [QuantumInitialization(name, size, bits)]
+            # Is this in the standard library?
+            if StandardLibrary.is_standard(name):
+                name = StandardLibrary.get_standard_name(name)
+            cargs = stmt.get_call_list().get_classical_arguments()
+            qargs = stmt.get_call_list().get_quantum_arguments()
+            operands = [name, len(cargs), len(qargs)]
+            for c in cargs:
+                operands += self.lower_classical_arg(c)
+            # The gate is applied once for each qubit of the last slice, so if that slice is a whole
+            # register, the register is passed instead, and the gate is broadcast over it
+            broadcast = None
+            for q in qargs:
+                if q.type == "q_slice":
+                    broadcast = q
+            for q in qargs:
+                if q is broadcast and self.is_whole_register(q):
+                    operands += (Q_REG, q.get_name().name)
+                else:
+                    operands += self.lower_quantum_arg(q)
+            yield GATE, operands, condition
+        elif stmt.data == "q_decl":
+            yield from quantum_initialization(
+                stmt.get_name().name, stmt.get_length(), stmt.get_bits(), condition
+            )
+        elif stmt.data == "c_decl" and self.helper_size > 0:
+            yield from constant_depth_classical_initialization(
+                stmt.get_name().name,
+                stmt.get_length(),
+                stmt.get_bits(),
+                self.helper_size,
+                condition,
+            )
         elif stmt.data == "c_decl":
-            name = stmt.get_name().name
-            size = stmt.get_length()
-            bits = stmt.get_bits()
-            return [ClassicalInitialization(name, size, bits)]
+            yield from classical_initialization(
+                stmt.get_name().name, stmt.get_length(), stmt.get_bits(), condition
+            )
         elif stmt.data == "measurement":
             expr = stmt.get_q_expr()
             r_name = stmt.get_r_name().name
@@ -104,32 +178,57 @@ class Transpiler:
             if expr.data == "q_index":
                 q_start = expr.get_pos()
                 q_end = q_start
-                return [MeasurementInstruction(r_name, r_start, q_name, q_start, q_end)]
             elif expr.data == "q_slice":
                 q_start, q_end = expr.get_start_end()
-                return [MeasurementInstruction(r_name, r_start, q_name, q_start, q_end)]
+                # A whole register measured into a whole classical register of the same size
+                if (
+                    r_start == 0
+                    and self.is_whole_register(expr)
+                    and self.register_size(stmt.get_r_name()) == q_end + 1
+                ):
+                    yield MEASURE_REGISTER, (q_name, r_name), condition
+                    return
             else:
                 raise Exception("Unimplemented")
+            yield MEASURE, (q_name, q_start, q_end, r_name, r_start), condition
         else:
-            raise Exception("Unexpected statement type: " + str(stmt.__dict__))
+            raise Exception("Unexpected statement type: " + stmt.data)
+
+    # Returns the size of the register an identifier refers to
+    def register_size(self, name) -> int:
+        return name.get_symbol().get_declaration().get_length()
+
+    def is_whole_register(self, q_slice) -> bool:
+        start, end = q_slice.get_start_end()
+        return start == 0 and end == self.register_size(q_slice.get_name()) - 1
 
-    def convert_classical_arg(self, arg):
+    # Arguments of comparisons are (kind, value) pairs, since conditions are not stored as operands
+    def lower_condition_arg(self, arg) -> tuple:
         if arg.type == "uint":
-            return UIntArgument(arg.value)
+            return UINT, arg.value
         elif arg.type == "v_ident":
-            return CRegArgument(arg.name)
+            return C_REG, arg.name
         else:
             raise Exception("Unexpected argument type: '" + arg.type + "'")
 
-    def convert_quantum_arg(self, arg):
+    def lower_classical_arg(self, arg) -> tuple:
+        if arg.type == "uint":
+            return uint_argument(arg.value)
+        elif arg.type == "v_ident":
+            return C_REG, arg.name
+        else:
+            raise Exception("Unexpected argument type: '" + arg.type + "'")
+
+    def lower_quantum_arg(self, arg) -> tuple:
         if arg.type == "v_ident":
-            return QuantumRegArgument(arg.name)
+            return Q_REG, arg.name
         elif arg.type == "q_slice":
             start, end = arg.get_start_end()
-            return QuantumSliceArgument(arg.get_name().name, start, end)
+            return Q_SLICE, arg.get_name().name, start, end
         elif arg.type == "q_index":
-            pos = arg.get_pos()
-            return QuantumIndexArgument(arg.get_name().name, pos)
+            return Q_INDEX, arg.get_name().name, arg.get_pos()
+        else:
+            raise Exception("Unexpected argument type: '" + arg.type + "'")
 
 
 class OpenQASMProgram:
@@ -150,15 +249,18 @@ class OpenQASMProgram:
         self.measurement_qubit_needed = measurement_qubit_needed
 
     def add_instruction(self, instructions):
-        self.instructions += instructions
+        self.instructions.extend(instructions)
 
-    def emit(self):
-        emission = ""
+    # Write the program's code into a file-like sink, instruction by instruction
+    def write(self, sink):
         if self.measurement_qubit_needed:
-            emission += "qreg " + MEASUREMENT_QUBIT_NAME + "[1];\n"
-        for instruction in self.instructions:
-            emission += instruction.emit()
-        return emission
+            sink.write("qreg " + MEASUREMENT_QUBIT_NAME + "[1];\n")
+        emit_instructions(self.instructions, sink.write)
+
+    def emit(self):
+        emission = StringIO()
+        self.write(emission)
+        return emission.getvalue()
 
 
 class OpenQASMGate:
@@ -169,18 +271,23 @@ class OpenQASMGate:
         self.qargs = qargs
 
     def add_instruction(self, instructions):
-        self.instructions += instructions
+        self.instructions.extend(instructions)
 
-    def emit(self):
-        header = (
+    # Write the gate's definition into a file-like sink
+    def write(self, sink):
+        sink.write(
             "gate "
             + self.name
             + " ("
             + ",".join(self.cargs)
             + ") "
             + ",".join(self.qargs)
-            + "{\n  "
+            + "{\n"
         )
-        body = "  ".join([instruction.emit() for instruction in self.instructions])
-        tail = "}"
-        return header + body + tail
+        emit_instructions(self.instructions, sink.write, indent="  ")
+        sink.write("}")
+
+    def emit(self):
+        emission = StringIO()
+        self.write(emission)
+        return emission.getvalue()
@@ -1,5 +1,23 @@
 from lark import Token
 
+# Dispatch tables that have already been built, by class and method prefix
+DISPATCH_TABLES = {}
+
+
+def dispatch_table(cls, prefix: str) -> dict:
+    """
+    Maps each node type to the method of cls named prefix + node type. The table is built once
+    per class, so finding the method for a node is a single dictionary lookup.
+    """
+    key = (cls, prefix)
+    if key not in DISPATCH_TABLES:
+        DISPATCH_TABLES[key] = {
+            name[len(prefix) :]: getattr(cls, name)
+            for name in dir(cls)
+            if name.startswith(prefix) and callable(getattr(cls, name))
+        }
+    return DISPATCH_TABLES[key]
+
 
 class TreeTraversal:
     def __init__(self, tree):
@@ -11,60 +29,116 @@ class TreeTraversal:
     def traverse(self):
         self.tree = self._traverse(self.tree)
 
+    def set_source(self, tree):
+        self.tree = tree
+
 
 class Visitor(TreeTraversal):
     def __init__(self, tree):
         super().__init__(tree)
+        self.visitors = dispatch_table(type(self), "visit_")
+        self.after_visitors = dispatch_table(type(self), "after_visit_")
 
+    # The tree is walked with an explicit stack instead of recursion, so that deeply nested
+    # trees (such as long sums) do not hit Python's recursion limit
     def _traverse(self, t):
         if isinstance(t, Token):
             return
-        self._process_tree(t)
-        for child in t.children:
-            self._traverse(child)
-        self._post_process_tree(t)
+        # Each entry is a node, and whether its children have already been visited
+        stack = [(t, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                self._post_process_tree(node)
+                continue
+            self._process_tree(node)
+            stack.append((node, True))
+            for child in reversed(node.children):
+                if not isinstance(child, Token):
+                    stack.append((child, False))
         return t
 
     def _process_tree(self, t):
-        try:
-            self.visit_any(t)
-            func = getattr(self, "visit_" + t.data)
-            func(t)
-        except (AttributeError, TypeError) as e:
-            if "visit_" not in str(e):
-                raise e
+        self.visit_any(t)
+        func = self.visitors.get(t.data)
+        if func is not None:
+            func(self, t)
 
     def _post_process_tree(self, t):
-        try:
-            func = getattr(self, "after_visit_" + t.data)
-            func(t)
-        except (AttributeError, TypeError):
-            return
+        func = self.after_visitors.get(t.data)
+        if func is not None:
+            func(self, t)
 
     def visit_any(self, t):
         pass
 
-    def set_source(self, tree):
-        self.tree = tree
-
 
 class Transformer(TreeTraversal):
     def __init__(self, tree):
         super().__init__(tree)
+        self.transformers = dispatch_table(type(self), "transform_")
+        self.after_transformers = dispatch_table(type(self), "after_transform_")
 
+    # Like Visitor, the tree is walked with an explicit stack. A node is transformed with transform_X
+    # before its children, and with after_transform_X after them. Either may return a replacement
+    # for the node, or None to remove it. A transformation that only changes the kind of a node can
+    # rewrite it in place with Scope.rewrite() and return the node itself.
     def _traverse(self, t):
         if isinstance(t, Token):
             return
         t = self._transform(t)
-        if t is not None:
-            for i, v in enumerate(t.children):
-                t.children[i] = self._traverse(v)
-            t.children = [c for c in t.children if c is not None]
+        if t is None:
+            return None
+        # Each frame is [node, children, index of the next child, whether a child was replaced,
+        # whether a child was removed]. Children are replaced in place, in the node's own list.
+        stack = [[t, self.children_of(t), 0, False, False]]
+        while stack:
+            frame = stack[-1]
+            node, children, i, changed, removed = frame
+            if i < len(children):
+                frame[2] = i + 1
+                v = children[i]
+                c = None if isinstance(v, Token) else self._transform(v)
+                if c is not v:
+                    children[i] = c
+                    frame[3] = True
+                    if c is None:
+                        frame[4] = True
+                if c is not None:
+                    stack.append([c, self.children_of(c), 0, False, False])
+                continue
+            stack.pop()
+            if changed:
+                if removed:
+                    children[:] = [c for c in children if c is not None]
+                # The list of an arena node is a copy, so it is stored back. For a Scope, this is
+                # the list it already holds.
+                node.children = children
+                # Children looked up by role through the payload have been replaced
+                node.reset_roles()
+            after = self.after_transformers.get(node.data)
+            if after is not None:
+                r = after(self, node)
+                if r is not node:
+                    if stack:
+                        parent = stack[-1]
+                        parent[1][parent[2] - 1] = r
+                        parent[3] = True
+                        if r is None:
+                            parent[4] = True
+                    else:
+                        t = r
         return t
 
+    # Returns the list of the children of a node, which are replaced in place. A Scope holds its own
+    # list, while the children of an arena node are a tuple, which is copied.
+    @staticmethod
+    def children_of(t) -> list:
+        children = t.children
+        return children if type(children) is list else list(children)
+
     def _transform(self, t):
-        try:
-            func = getattr(self, "transform_" + t.data)
-            return func(t)
-        except (AttributeError, TypeError):
+        func = self.transformers.get(t.data)
+        if func is None:
             return t
+        return func(self, t)